@@ -0,0 +1,77 @@
+"""Stream of build events as JSON Lines, for tools that follow the progress of builds.
+
+Each line is a json object with at least the event name and time. The package events are named after the new state
+of the package (i.e. active, finished, failed, skipped) and include the previous state, the duration (once the
+package stops) and the number of unique errors and warnings so far.
+"""
+import json
+import os
+import socket
+import time
+
+
+def open_event_stream(target):
+    """Open a file-like object for the target, which is a path, fd:N or unix:path (for a listening socket)."""
+    if target.startswith('fd:'):
+        return os.fdopen(int(target[3:]), 'w', buffering=1)
+    elif target.startswith('unix:'):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.connect(target[5:])
+        return sock.makefile('w', buffering=1)
+    else:
+        return open(target, 'w', buffering=1)
+
+
+class BuildEventWriter:
+    def __init__(self, target, status):
+        self.stream = open_event_stream(target)
+        self.status = status
+        self.closed = False
+        status.add_listener(self.on_change)
+
+    def write(self, event, **kwargs):
+        if self.closed:
+            return
+        data = {'event': event, 'time': time.time()}
+        data.update(kwargs)
+        try:
+            self.stream.write(json.dumps(data) + '\n')
+        except (OSError, ValueError):
+            # The other end went away, which should not stop the build
+            self.closed = True
+            self.remove_listener()
+
+    def remove_listener(self):
+        if self.on_change in self.status.listeners:
+            self.status.listeners.remove(self.on_change)
+
+    def on_change(self, pkg=None, old_state=None, new_state=None):
+        if pkg is None:
+            return
+        data = {'package': pkg, 'previous_state': old_state}
+        # Use the time of the transition, since the transitions before the dependencies are known are delayed
+        if new_state == 'active':
+            data['time'] = self.status.start_times[pkg]
+        elif new_state in ['finished', 'failed', 'skipped'] and pkg in self.status.stop_times:
+            data['time'] = self.status.stop_times[pkg]
+            if pkg in self.status.start_times:
+                data['duration'] = data['time'] - self.status.start_times[pkg]
+        counts = self.status.diagnostic_counts.get(pkg, {})
+        data['errors'] = counts.get('error', 0)
+        data['warnings'] = counts.get('warning', 0)
+        self.write(new_state, **data)
+
+    def start(self, packages, unchanged=[]):
+        self.write('build_started', packages=packages, unchanged=sorted(unchanged))
+
+    def finish(self, return_code):
+        counts = {'finished': 0, 'failed': 0, 'skipped': 0}
+        for state in counts:
+            counts[state] = len(self.status.pkg_lists[state])
+        self.write('build_finished', return_code=return_code, elapsed=time.time() - self.status.start_time, **counts)
+        self.remove_listener()
+        self.closed = True
+        try:
+            self.stream.close()
+        except (OSError, ValueError):
+            pass
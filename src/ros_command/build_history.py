@@ -0,0 +1,303 @@
+import asyncio
+import collections
+import datetime
+import os
+import pathlib
+import socket
+import statistics
+import time
+
+from ros_command.util import format_duration
+
+HISTORY_PATH = pathlib.Path('~/.ros/ros_command_history.db').expanduser()
+SCHEMA_VERSION = 1
+SCHEMA = [
+    'CREATE TABLE IF NOT EXISTS builds (id INTEGER PRIMARY KEY, workspace TEXT, host TEXT, start REAL, stop REAL, '
+    'return_code INTEGER, cmake_build_type TEXT, workers INTEGER, cache_hits INTEGER, cache_misses INTEGER)',
+    'CREATE TABLE IF NOT EXISTS package_builds (build_id INTEGER, package TEXT, start REAL, stop REAL, result TEXT, '
+    'peak_memory INTEGER)',
+    'CREATE INDEX IF NOT EXISTS builds_by_workspace ON builds (workspace)',
+    'CREATE INDEX IF NOT EXISTS package_builds_by_build ON package_builds (build_id)',
+]
+
+# Weight of the most recent build when updating the expected duration of each package
+DURATION_SMOOTHING = 0.5
+
+# Parameters for rosbuild -j auto
+MEMORY_SAMPLE_PERIOD = 1.0
+MEMORY_FRACTION = 0.8  # Fraction of the available memory the build can use
+DEFAULT_PACKAGE_MEMORY = 2 << 30
+
+# Parameters for rosbuild --stats
+STATS_BUILDS = 20
+STATS_SLOWEST = 10
+REGRESSION_FACTOR = 1.25
+REGRESSION_MIN_SECONDS = 1.0
+
+
+def load_durations(workspace_root):
+    """Return the expected build duration (in seconds) of each package in the workspace, based on previous builds."""
+    from ros_command.cache import get_cache
+
+    entry = get_cache().get([str(workspace_root), 'build_durations'])
+    if entry is None:
+        return {}
+    return entry[2]
+
+
+def save_durations(workspace_root, durations):
+    from ros_command.cache import get_cache
+
+    expected_durations = load_durations(workspace_root)
+    for pkg, duration in durations.items():
+        if pkg in expected_durations:
+            duration = DURATION_SMOOTHING * duration + (1 - DURATION_SMOOTHING) * expected_durations[pkg]
+        expected_durations[pkg] = duration
+    get_cache().set([str(workspace_root), 'build_durations'], expected_durations)
+
+
+def get_available_memory():
+    """Return the number of bytes of memory available to start new processes, or None if unknown."""
+    try:
+        with open('/proc/meminfo') as f:
+            for line in f:
+                if line.startswith('MemAvailable:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        return
+
+
+def get_package_memory(build_folder, packages, proc_folder='/proc'):
+    """Return the total resident memory (in bytes) of the processes running in each package's build folder.
+
+    The compilers and linkers run within build/<pkg> (or one of its subfolders), which is how they are attributed
+    to the packages.
+    """
+    build_prefix = os.path.join(os.path.realpath(build_folder), '')
+    page_size = os.sysconf('SC_PAGE_SIZE')
+    memory = collections.defaultdict(int)
+    for pid in os.listdir(proc_folder):
+        if not pid.isdigit():
+            continue
+        try:
+            cwd = os.readlink(os.path.join(proc_folder, pid, 'cwd'))
+            if not cwd.startswith(build_prefix):
+                continue
+            with open(os.path.join(proc_folder, pid, 'statm')) as f:
+                rss = int(f.read().split()[1]) * page_size
+        except (OSError, ValueError, IndexError):
+            # i.e. processes that already exited or belong to other users
+            continue
+        pkg = cwd[len(build_prefix):].split(os.sep)[0]
+        if pkg in packages:
+            memory[pkg] += rss
+    return memory
+
+
+class MemorySampler:
+    """Periodically measure the peak memory used by each package in the build.
+
+    The memory of a package is the total resident memory of the processes running in its build folder.
+    The peaks are stored in the status's peak_memory dictionary.
+    """
+
+    def __init__(self, status, workspace_root, period=MEMORY_SAMPLE_PERIOD):
+        self.status = status
+        self.build_folder = workspace_root / 'build'
+        self.period = period
+        self.task = None
+        if os.path.exists('/proc/self/statm'):
+            self.task = asyncio.ensure_future(self.sample())
+
+    async def sample(self):
+        loop = asyncio.get_event_loop()
+        while True:
+            await asyncio.sleep(self.period)
+            active = set(self.status.pkg_lists['active'])
+            if not active:
+                continue
+            memory = await loop.run_in_executor(None, get_package_memory, self.build_folder, active)
+            for pkg, rss in memory.items():
+                self.status.peak_memory[pkg] = max(self.status.peak_memory.get(pkg, 0), rss)
+
+    def stop(self):
+        if self.task:
+            self.task.cancel()
+
+
+def get_automatic_jobs(workspace_root):
+    """Return the number of packages to build in parallel and the number of make jobs for each package.
+
+    The number of packages is limited by the number of cores and by the available memory,
+    based on how much memory the packages used in previous builds.
+    The cores are then divided between the packages for the make jobs.
+    """
+    cores = os.cpu_count() or 1
+    available = get_available_memory()
+    if available is None:
+        return cores, 1
+
+    peaks = sorted(BuildHistory().get_peak_memory(workspace_root).values())
+    if peaks:
+        # Plan for the heavier packages building at the same time
+        package_memory = peaks[int(0.9 * (len(peaks) - 1))]
+    else:
+        package_memory = DEFAULT_PACKAGE_MEMORY
+
+    workers = int(available * MEMORY_FRACTION // max(package_memory, 1))
+    workers = min(max(workers, 1), cores)
+    return workers, max(cores // workers, 1)
+
+
+def get_critical_path_lengths(packages, upstream, durations):
+    """Return the time needed to build each package and everything downstream of it, with unlimited workers.
+
+    packages is the set of packages to consider, upstream is a dictionary of their dependencies
+    and durations is the time each package takes to build.
+    """
+    downstream = collections.defaultdict(list)
+    for pkg in packages:
+        for dep in upstream.get(pkg, []):
+            if dep in packages:
+                downstream[dep].append(pkg)
+
+    lengths = {}
+
+    def get_length(pkg):
+        if pkg not in lengths:
+            lengths[pkg] = durations[pkg] + max((get_length(pkg2) for pkg2 in downstream[pkg]), default=0.0)
+        return lengths[pkg]
+
+    for pkg in packages:
+        get_length(pkg)
+    return lengths
+
+
+def get_critical_path(packages, upstream, durations):
+    """Return the longest chain of packages that must be built one after another."""
+    lengths = get_critical_path_lengths(packages, upstream, durations)
+    path = []
+    candidates = [pkg for pkg in packages if not any(dep in packages for dep in upstream.get(pkg, []))]
+    while candidates:
+        pkg = max(candidates, key=lengths.get)
+        path.append(pkg)
+        candidates = [pkg2 for pkg2 in packages if pkg in upstream.get(pkg2, [])]
+    return path
+
+
+class BuildHistory:
+    """Database of the timing of every package in every build."""
+
+    def __init__(self, path=HISTORY_PATH):
+        import sqlite3
+
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(str(path), timeout=5.0)
+        if self.get_schema_version() != SCHEMA_VERSION:
+            # Several builds may be creating the database at the same time,
+            # so take the write lock and check again before creating it
+            with self.conn:
+                self.conn.execute('BEGIN IMMEDIATE')
+                if self.get_schema_version() != SCHEMA_VERSION:
+                    for statement in SCHEMA:
+                        self.conn.execute(statement)
+                    self.conn.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
+
+    def get_schema_version(self):
+        return self.conn.execute('PRAGMA user_version').fetchone()[0]
+
+    def record_build(self, workspace_root, status, return_code, cmake_build_type):
+        """Record the build and return whether it was written (i.e. not if the database stayed locked)."""
+        import sqlite3
+
+        cache_hits, cache_misses = status.compiler_cache_stats or (None, None)
+        rows = [(pkg, start, status.stop_times.get(pkg), status.states.get(pkg), status.peak_memory.get(pkg))
+                for pkg, start in status.start_times.items()]
+        try:
+            with self.conn:
+                cursor = self.conn.execute('INSERT INTO builds (workspace, host, start, stop, return_code, '
+                                           'cmake_build_type, workers, cache_hits, cache_misses) '
+                                           'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                                           (str(workspace_root), socket.gethostname(), status.start_time,
+                                            time.time(), return_code, cmake_build_type, status.workers, cache_hits,
+                                            cache_misses))
+                build_id = cursor.lastrowid
+                self.conn.executemany('INSERT INTO package_builds (build_id, package, start, stop, result, '
+                                      'peak_memory) VALUES (?, ?, ?, ?, ?, ?)',
+                                      [(build_id,) + row for row in rows])
+            return True
+        except sqlite3.OperationalError:
+            # The history should never fail a build
+            return False
+
+    def get_builds(self, workspace_root, limit):
+        """Return the most recent builds in the workspace as dictionaries, oldest first."""
+        cursor = self.conn.execute('SELECT * FROM builds WHERE workspace = ? ORDER BY start DESC LIMIT ?',
+                                   (str(workspace_root), limit))
+        columns = [d[0] for d in cursor.description]
+        return [dict(zip(columns, row)) for row in reversed(cursor.fetchall())]
+
+    def get_package_builds(self, build_id):
+        cursor = self.conn.execute('SELECT package, start, stop, result FROM package_builds WHERE build_id = ?',
+                                   (build_id,))
+        return cursor.fetchall()
+
+    def get_peak_memory(self, workspace_root):
+        """Return the most recently recorded peak memory of each package in the workspace."""
+        cursor = self.conn.execute('SELECT package, peak_memory FROM package_builds JOIN builds '
+                                   'ON package_builds.build_id = builds.id '
+                                   'WHERE workspace = ? AND peak_memory IS NOT NULL ORDER BY builds.start',
+                                   (str(workspace_root),))
+        return dict(cursor.fetchall())
+
+
+def print_stats(workspace_root, num_builds=STATS_BUILDS):
+    import click
+
+    history = BuildHistory()
+    builds = history.get_builds(workspace_root, num_builds)
+    if not builds:
+        click.secho(f'No builds recorded for {workspace_root}', fg='yellow')
+        return
+
+    package_durations = collections.defaultdict(list)
+    click.secho(f'Last {len(builds)} builds', fg='white', bold=True)
+    for build in builds:
+        wall_time = build['stop'] - build['start']
+        busy_time = 0.0
+        for pkg, start, stop, result in history.get_package_builds(build['id']):
+            if stop is None:
+                continue
+            busy_time += stop - start
+            if result == 'finished':
+                package_durations[pkg].append(stop - start)
+
+        # The fraction of the available worker time spent building packages
+        utilization = busy_time / (wall_time * build['workers']) if wall_time > 0 else 0.0
+        stamp_s = datetime.datetime.fromtimestamp(build['start']).strftime('%Y-%m-%d %H:%M')
+        color = 'green' if build['return_code'] == 0 else 'red'
+        click.secho(f' {stamp_s} ', nl=False)
+        click.secho(f'{format_duration(wall_time):>9} ', fg=color, nl=False)
+        click.secho(f'{utilization:4.0%} of {build["workers"]} workers busy', fg='bright_blue',
+                    nl=not build['cache_hits'] and not build['cache_misses'])
+        if build['cache_hits'] or build['cache_misses']:
+            hit_rate = build['cache_hits'] / (build['cache_hits'] + build['cache_misses'])
+            click.secho(f', {hit_rate:4.0%} compiler cache hits', fg='bright_blue')
+
+    medians = {pkg: statistics.median(durations) for pkg, durations in package_durations.items()}
+    click.secho('Slowest packages (median)', fg='white', bold=True)
+    for pkg in sorted(medians, key=medians.get, reverse=True)[:STATS_SLOWEST]:
+        click.secho(f' {format_duration(medians[pkg]):>9} {pkg}')
+
+    regressions = []
+    for pkg, durations in package_durations.items():
+        if len(durations) < 2:
+            continue
+        previous = statistics.median(durations[:-1])
+        if durations[-1] > previous * REGRESSION_FACTOR and durations[-1] - previous > REGRESSION_MIN_SECONDS:
+            regressions.append((pkg, previous, durations[-1]))
+    if regressions:
+        click.secho('Regressions (latest build vs median)', fg='white', bold=True)
+        for pkg, previous, latest in sorted(regressions, key=lambda r: r[2] - r[1], reverse=True):
+            click.secho(f' {format_duration(previous):>9} -> ', nl=False)
+            click.secho(f'{format_duration(latest):>9} {pkg}', fg='red')
@@ -1,18 +1,15 @@
 import asyncio
 import os
 import re
+import time
 
 from ros_command.terminal_display import DynamicLayoutTerminalDisplay, Gauge, HSplit, Log, Marquee, TerminalComponent
 from ros_command.terminal_display import Text, VSplit
+from ros_command.util import format_duration, get_config
 
-STATUS_COLORS = {
-    'blocked': 'magenta',
-    'queued': 'yellow',
-    'active': 'blue',
-    'finished': 'green',
-    'failed': 'red',
-    'skipped': 'cyan'
-}
+DEFAULT_MAX_FPS = 10
+# Period for animating the marquee and updating the clock, independent of the status changes
+TICK_PERIOD = 0.5
 
 EMOJIS = {
     'melodic': '🎶',
@@ -38,6 +35,9 @@ class BuildStatusHeader(TerminalComponent):
     def draw(self, display):
         marquee_s = str(self.marquee)
         elapsed_s = self.status.get_elapsed_time()
+        remaining = self.status.get_remaining_time()
+        if remaining is not None:
+            elapsed_s += f' (~{format_duration(remaining)} left)'
         if self.h == 1:
             display(self.emoji, xy=(self.x0, self.y0))
             display(marquee_s, xy=(self.x0 + 2, self.y0))
@@ -72,7 +72,12 @@ class CombinedStatusDisplay(TerminalComponent):
 
 
 class BuildStatusDisplay:
-    def __init__(self, status, update_period=0.1):
+    """Terminal interface for a BuildStatus.
+
+    Redraws are triggered by changes to the status, but happen at most once per update_period.
+    """
+
+    def __init__(self, status, update_period=None):
         self.status = status
         self.term = DynamicLayoutTerminalDisplay()
         self.header = BuildStatusHeader(status, self.term)
@@ -100,31 +105,60 @@ class BuildStatusDisplay:
 
         self.term.draw()
 
-        self.update_period = 0.1
-        self.task = asyncio.ensure_future(self.timer_cb())
-
-    async def timer_cb(self):
-        await asyncio.sleep(self.update_period)
+        if update_period is None:
+            update_period = 1.0 / get_config('display_max_fps', DEFAULT_MAX_FPS)
+        self.update_period = update_period
+        self.last_draw = time.time()
+        self.loop = asyncio.get_event_loop()
+        self.redraw_handle = None
+        self.tick_handle = self.loop.call_later(TICK_PERIOD, self.tick)
+        self.status.add_listener(self.request_redraw)
+
+    def request_redraw(self, *args):
+        """Schedule a redraw, unless one is already scheduled."""
+        if self.redraw_handle is not None:
+            return
+        delay = max(self.last_draw + self.update_period - time.time(), 0.0)
+        self.redraw_handle = self.loop.call_later(delay, self.redraw)
+
+    def redraw(self):
+        self.redraw_handle = None
+        self.last_draw = time.time()
         self.show()
-        self.task = asyncio.ensure_future(self.timer_cb())
+
+    def tick(self):
+        self.header.marquee.advance()
+        self.request_redraw()
+        self.tick_handle = self.loop.call_later(TICK_PERIOD, self.tick)
 
     def get_elapsed_time(self):
         return self.status.get_elapsed_time()
 
+    def get_label(self, pkg):
+        """Return the package name with its number of errors and warnings."""
+        summary = self.status.get_diagnostic_summary(pkg)
+        return f'{pkg} {summary}' if summary else pkg
+
     def show(self):
-        self.header.marquee.advance()
-        self.active_gui.update(self.status.pkg_lists['active'])
-        self.error_gui.update(self.status.pkg_lists['failed'])
-        self.combined_gui.active = self.status.pkg_lists['active']
-        self.combined_gui.error = self.status.pkg_lists['failed']
+        active = list(self.status.pkg_lists['active'])
+        failed = list(self.status.pkg_lists['failed'])
+        self.active_gui.update([self.get_label(pkg) for pkg in active])
+        self.error_gui.update([self.get_label(pkg) for pkg in failed])
+        self.combined_gui.active = active
+        self.combined_gui.error = failed
         self.complete_gui.update(len(self.status.pkg_lists['finished']), self.status.n)
         self.queued_gui.update(len(self.status.pkg_lists['queued']), self.status.n)
         self.blocked_gui.update(len(self.status.pkg_lists['blocked']), self.status.n)
         self.log_gui.update(self.status.error_buffer)
+        summary = self.status.get_diagnostic_summary()
+        self.log_gui.title = f'{self.log_gui.base_title} {summary}' if summary else self.log_gui.base_title
         self.term.draw()
 
     def finish(self):
-        self.task.cancel()
+        self.tick_handle.cancel()
+        if self.redraw_handle is not None:
+            self.redraw_handle.cancel()
+        self.status.listeners.remove(self.request_redraw)
         self.header.finish()
         self.term.finish()
         self.show()
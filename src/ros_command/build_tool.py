@@ -1,43 +1,134 @@
+import asyncio
 import collections
+from concurrent.futures import ThreadPoolExecutor
+import os
 import re
+import statistics
 import sys
 import time
 
-import click
-
 from betsy_ros import BuildType
 
-from ros_command.build_status_display import BuildStatusDisplay, STATUS_COLORS
+from ros_command.build_history import BuildHistory, MemorySampler, get_critical_path, get_critical_path_lengths
+from ros_command.build_history import load_durations, save_durations
 from ros_command.command_lib import get_output, run
+from ros_command.compiler_cache import get_cache_environment, get_cache_stats, get_compiler_cache, get_launcher_args
 from ros_command.completion import LocalPackageCompleter
-from ros_command.util import get_config
-
-
-PKG_PATTERN = r'\s+([\w\-]+)\s+'
-BRACKET_PATTERN = r'\[\s*(.*)\s*\]\s*'
-STATUS_PATTERNS = [
-    ('start', re.compile(r'Starting *>>>' + PKG_PATTERN)),
-    ('stop', re.compile(r'Finished *<<<' + PKG_PATTERN + BRACKET_PATTERN)),
-    ('fail', re.compile(r'Failed *<<<' + PKG_PATTERN + BRACKET_PATTERN)),
-    ('abort', re.compile(r'Aborted *<<<' + PKG_PATTERN + BRACKET_PATTERN)),
-    ('abort', re.compile(r'Abandoned *<<<' + PKG_PATTERN + BRACKET_PATTERN))
-]
-SKIPPABLE_PATTERNS = [
-    re.compile(r'^Summary:.*'),
-    re.compile(r'^\[build( [\d\.:]+ s)?\].*'),
-    re.compile(r'^\[Processing: .*\]'),
-    re.compile(r'^\s*\d+ packages? ([^\:]+):.*'),
-    re.compile(r'^\s+\d+ packages? not processed.*')
-]
+from ros_command.packages import get_manifest_fingerprint, get_source_folder
+from ros_command.util import format_duration, get_config
+
+
+# Lines of output that can be ignored, all matched at the start of the line
+SKIPPABLE_PATTERN = re.compile(
+    r'Summary:'
+    r'|\[build( [\d\.:]+ s)?\]'
+    r'|\[Processing: .*\]'
+    r'|\s*\d+ packages? [^\:]+:'
+    r'|\s+\d+ packages? not processed'
+)
+# Status updates, which always contain one of the STATUS_MARKERS
+STATUS_MARKERS = ['>>>', '<<<']
+STATUS_PATTERN = re.compile(
+    r'Starting *>>>\s+(?P<start_pkg>[\w\-]+)\s+'
+    r'|(?P<end_verb>Finished|Failed|Aborted|Abandoned) *<<<\s+(?P<end_pkg>[\w\-]+)\s+\[\s*(.*)\s*\]\s*'
+)
+# Headers of the sections of output from a single package, from colcon (--- stderr: pkg)
+# or catkin_tools (Errors     << pkg:make /path/to/log)
+OUTPUT_SECTION_PREFIXES = ('--- ', 'Errors ', 'Warnings ')
+OUTPUT_SECTION_PATTERN = re.compile(r'(?:--- (?:stderr|stdout): |(?:Errors|Warnings) +<< )(?P<pkg>[\w\-]+)')
+# Ends of the sections, a line of dashes (colcon) or dots (catkin_tools)
+OUTPUT_SECTION_END_PATTERN = re.compile(r'---|\.{10,}')
+# Compiler and CMake diagnostics, with the lines that follow them (i.e. notes and code snippets) indented
+COMPILER_DIAGNOSTIC_PATTERN = re.compile(r'(?P<file>[^\s:][^:]*):(?P<line>\d+):(?:\d+:)?\s+'
+                                         r'(?P<severity>warning|error|fatal error|note):\s+(?P<message>.*)')
+CMAKE_DIAGNOSTIC_PATTERN = re.compile(r'CMake (?P<severity>Error|Warning|Deprecation Warning)(?: \(dev\))?'
+                                      r' at (?P<file>[^:]+):(?P<line>\d+)\s*(?P<message>.*)')
+# Unindented line within a CMake diagnostic
+CMAKE_CALL_STACK = 'Call Stack (most recent call first):'
+# Lines printed before a compiler diagnostic to give its context
+DIAGNOSTIC_CONTEXT_PATTERN = re.compile(r'In file included from '
+                                        r'|\s+from \S+:\d+[:,]$'
+                                        r'|[^\s:][^:]*: (In (member )?function|In instantiation of|In constructor'
+                                        r'|In destructor|At global scope)')
+SEVERITIES = {
+    'warning': 'warning',
+    'error': 'error',
+    'fatal error': 'error',
+    'note': 'note',
+    'Error': 'error',
+    'Warning': 'warning',
+    'Deprecation Warning': 'warning',
+}
+Diagnostic = collections.namedtuple('Diagnostic', ['file', 'line', 'severity', 'message', 'package'])
+# Number of error lines kept in memory for the display
+ERROR_BUFFER_SIZE = 1000
+# Dependencies that determine the build order (and what gets built with --packages-up-to)
+BUILD_DEPENDENCY_TYPES = ['build_depends', 'buildtool_depends', 'build_export_depends', 'buildtool_export_depends',
+                          'exec_depends']
+PackageInfo = collections.namedtuple('PackageInfo', ['path', 'deps', 'test_deps'])
+
+STATUS_VERBS = {
+    'Finished': 'stop',
+    'Failed': 'fail',
+    'Aborted': 'abort',
+    'Abandoned': 'abort',
+}
+
+STATUS_COLORS = {
+    'blocked': 'magenta',
+    'queued': 'yellow',
+    'active': 'blue',
+    'finished': 'green',
+    'failed': 'red',
+    'skipped': 'cyan'
+}
 
 
 class BuildStatus:
-    def __init__(self):
+    def __init__(self, expected_durations={}, workers=None, error_log=None):
         self.start_time = time.time()
+        self.dependencies = {}
+        # The upstream dependencies of each blocked package that have not finished yet
         self.upstream_deps = {}
-        self.pkg_lists = collections.defaultdict(list)
-        self.error_buffer = []
+        self.downstream_deps = collections.defaultdict(set)
+        self.states = {}
+        # Ordered sets of packages in each state (dicts with None values)
+        self.pkg_lists = collections.defaultdict(dict)
+        # Status updates received before the dependencies are known, which are replayed in set_dependencies
+        self.pending_events = []
+        # The most recent error lines, with all of them stored in the error_log (if any)
+        self.error_buffer = collections.deque(maxlen=ERROR_BUFFER_SIZE)
+        self.n_error_lines = 0
+        self.error_log = error_log
+        # The package whose output is currently being printed
+        self.output_package = None
+        # Number of times each unique Diagnostic was printed, and number of unique diagnostics of each severity
+        self.diagnostics = {}
+        self.diagnostic_counts = collections.defaultdict(collections.Counter)
+        # Whether the lines following a repeated diagnostic are being left out of the error buffer
+        self.repeating = False
+        # Context lines waiting to see whether the following diagnostic is repeated
+        self.context_lines = []
+        # CMake diagnostic (and its lines) waiting for the first line of its message
+        self.pending_diagnostic = None
+        self.pending_lines = []
         self.n = 0
+        # Functions called whenever the states or errors change,
+        # with the package, its old and new state for state changes and no arguments otherwise
+        self.listeners = []
+
+        # Timing
+        self.start_times = {}
+        self.stop_times = {}
+        self.durations = {}
+        self.peak_memory = {}
+        # (name, start, stop) of the steps taken by rosbuild itself
+        self.phases = []
+
+        # Compiler cache (hits, misses) during the build, if available
+        self.compiler_cache_stats = None
+        self.expected_durations = expected_durations
+        self.workers = workers or os.cpu_count() or 1
 
     def out_callback(self, line):
         self.output_callback(line, False)
@@ -45,95 +136,246 @@ class BuildStatus:
     def err_callback(self, line):
         self.output_callback(line, True)
 
+    def out_batch_callback(self, lines):
+        self.output_batch_callback(lines, False)
+
+    def err_batch_callback(self, lines):
+        self.output_batch_callback(lines, True)
+
     def output_callback(self, line, is_err):
-        # Split by \r if needed
-        if '\r' in line:
-            for bit in line.split('\r'):
-                if bit:
-                    self.output_callback(bit, is_err)
+        self.output_batch_callback([line], is_err)
+
+    def output_batch_callback(self, lines, is_err):
+        n_error_lines = self.n_error_lines
+        for line in lines:
+            # Split by \r if needed
+            if '\r' in line:
+                for bit in line.split('\r'):
+                    if bit:
+                        self.classify_line(bit)
+            elif line:
+                self.classify_line(line)
+        # Notify the listeners once for all the new error lines
+        if self.n_error_lines != n_error_lines:
+            self.notify()
+
+    def classify_line(self, line):
+        if SKIPPABLE_PATTERN.match(line):
             return
 
-        for pattern in SKIPPABLE_PATTERNS:
-            if pattern.match(line):
+        # Only search for status updates in lines that could contain them
+        if STATUS_MARKERS[0] in line or STATUS_MARKERS[1] in line:
+            m = STATUS_PATTERN.search(line)
+            if m:
+                if m.group('start_pkg'):
+                    self.handle_event('start', m.group('start_pkg'))
+                else:
+                    self.handle_event(STATUS_VERBS[m.group('end_verb')], m.group('end_pkg'))
                 return
-        for name, pattern in STATUS_PATTERNS:
-            m = pattern.search(line)
+
+        line = line.rstrip()
+        if line.startswith(OUTPUT_SECTION_PREFIXES):
+            m = OUTPUT_SECTION_PATTERN.match(line)
             if m:
-                getattr(self, name)(m.group(1))
+                self.output_package = m.group('pkg')
+
+        if self.error_log:
+            self.error_log.add_line(self.output_package, line)
+
+        if self.pending_diagnostic:
+            if not line:
+                self.pending_lines.append(line)
                 return
+            self.add_pending_diagnostic(line if line[:1] in ' \t' else None)
+
+        # Most lines are not diagnostics, so check for the separators the patterns need before matching them
+        has_separator = ': ' in line
+        if (has_separator or 'from ' in line) and DIAGNOSTIC_CONTEXT_PATTERN.match(line):
+            self.context_lines.append(line)
+            return
+
+        if has_separator or line.startswith('CMake '):
+            diagnostic = parse_diagnostic(line, self.output_package)
+        else:
+            diagnostic = None
+        if diagnostic and line.startswith('CMake '):
+            # The header is the same for every message from one call site, so the message body is needed too
+            self.pending_diagnostic = diagnostic
+            self.pending_lines, self.context_lines = self.context_lines + [line], []
+            return
+        elif diagnostic and diagnostic.severity != 'note':
+            self.repeating = self.add_diagnostic(diagnostic) > 1
+        elif not diagnostic and line[:1] not in ' \t' and line != CMAKE_CALL_STACK:
+            self.repeating = False
+
+        # Repeated diagnostics (with their context and notes) are only kept in the error log
+        context_lines, self.context_lines = self.context_lines, []
+        if not self.repeating:
+            for context_line in context_lines:
+                self.buffer_error_line(context_line)
+            self.buffer_error_line(line)
+
+        if line[:1] in '-.' and OUTPUT_SECTION_END_PATTERN.fullmatch(line):
+            self.output_package = None
+
+    def handle_event(self, name, pkg):
+        if self.pending_events is not None:
+            self.pending_events.append((name, pkg, time.time()))
+        else:
+            getattr(self, name)(pkg)
+
+    def add_listener(self, listener):
+        self.listeners.append(listener)
+
+    def notify(self, *args):
+        for listener in list(self.listeners):
+            listener(*args)
 
-        self.add_error_line(line.rstrip())
+    def set_state(self, pkg, state):
+        old_state = self.states.get(pkg)
+        if old_state is not None:
+            del self.pkg_lists[old_state][pkg]
+        self.states[pkg] = state
+        self.pkg_lists[state][pkg] = None
+        self.notify(pkg, old_state, state)
 
     def set_dependencies(self, upstream):
+        self.dependencies = {}
         self.upstream_deps = {}
+        self.downstream_deps = collections.defaultdict(set)
         self.n = len(upstream)
         for pkg, deps in upstream.items():
+            # Ignore dependencies outside of the build, since they will never finish
+            deps = {dep for dep in deps if dep in upstream}
+            self.dependencies[pkg] = set(deps)
+            for dep in deps:
+                self.downstream_deps[dep].add(pkg)
+
             if deps:
-                self.pkg_lists['blocked'].append(pkg)
                 self.upstream_deps[pkg] = deps
+                self.set_state(pkg, 'blocked')
             else:
-                self.pkg_lists['queued'].append(pkg)
+                self.set_state(pkg, 'queued')
+
+        events = self.pending_events or []
+        self.pending_events = None
+        for name, pkg, stamp in events:
+            getattr(self, name)(pkg, stamp)
 
-    def start(self, pkg):
-        if pkg in self.pkg_lists['queued']:
-            self.pkg_lists['queued'].remove(pkg)
-        self.pkg_lists['active'].append(pkg)
+    def start(self, pkg, stamp=None):
+        self.upstream_deps.pop(pkg, None)
+        self.start_times[pkg] = stamp or time.time()
+        self.set_state(pkg, 'active')
 
-    def stop(self, pkg):
-        if pkg not in self.pkg_lists['active']:
+    def stop(self, pkg, stamp=None):
+        if self.states.get(pkg) != 'active':
             return
-        self.pkg_lists['active'].remove(pkg)
-        self.pkg_lists['finished'].append(pkg)
-        for pkg2, deps in list(self.upstream_deps.items()):
-            if pkg in deps:
-                deps.remove(pkg)
-                if not deps:
-                    del self.upstream_deps[pkg2]
-                    self.pkg_lists['blocked'].remove(pkg2)
-                    self.pkg_lists['queued'].append(pkg2)
-
-    def fail(self, pkg):
-        self.pkg_lists['active'].remove(pkg)
-        self.pkg_lists['failed'].append(pkg)
-        for pkg2, deps in list(self.upstream_deps.items()):
-            if pkg in deps:
-                self.pkg_lists['blocked'].remove(pkg2)
-                self.pkg_lists['skipped'].append(pkg2)
-                if not deps:
-                    del self.upstream_deps[pkg2]
-
-    def abort(self, pkg):
-        if pkg not in self.pkg_lists['blocked']:
+        self.stop_times[pkg] = stamp or time.time()
+        if pkg in self.start_times:
+            self.durations[pkg] = self.stop_times[pkg] - self.start_times[pkg]
+        self.set_state(pkg, 'finished')
+        for pkg2 in self.downstream_deps[pkg]:
+            deps = self.upstream_deps.get(pkg2)
+            if deps is None:
+                continue
+            deps.discard(pkg)
+            if not deps:
+                del self.upstream_deps[pkg2]
+                if self.states[pkg2] == 'blocked':
+                    self.set_state(pkg2, 'queued')
+
+    def fail(self, pkg, stamp=None):
+        self.stop_times[pkg] = stamp or time.time()
+        self.set_state(pkg, 'failed')
+
+        # Skip everything downstream
+        to_skip = list(self.downstream_deps[pkg])
+        while to_skip:
+            pkg2 = to_skip.pop()
+            if self.states.get(pkg2) not in ['blocked', 'queued']:
+                continue
+            self.upstream_deps.pop(pkg2, None)
+            self.set_state(pkg2, 'skipped')
+            to_skip += self.downstream_deps[pkg2]
+
+    def abort(self, pkg, stamp=None):
+        if self.states.get(pkg) not in ['blocked', 'queued', 'active']:
             return
-        self.pkg_lists['blocked'].remove(pkg)
-        self.pkg_lists['skipped'].append(pkg)
+        if self.states[pkg] == 'active':
+            self.stop_times[pkg] = stamp or time.time()
+        self.upstream_deps.pop(pkg, None)
+        self.set_state(pkg, 'skipped')
+
+    def add_pending_diagnostic(self, body_line=None):
+        """Count the pending CMake diagnostic, including the first line of its message if available."""
+        diagnostic, self.pending_diagnostic = self.pending_diagnostic, None
+        if body_line:
+            diagnostic = diagnostic._replace(message=f'{diagnostic.message} {body_line.strip()}'.strip())
+        self.repeating = self.add_diagnostic(diagnostic) > 1
+        lines, self.pending_lines = self.pending_lines, []
+        if not self.repeating:
+            for line in lines:
+                self.buffer_error_line(line)
+
+    def add_diagnostic(self, diagnostic):
+        """Count the diagnostic and return the number of times it has been seen."""
+        count = self.diagnostics.get(diagnostic, 0) + 1
+        self.diagnostics[diagnostic] = count
+        if count == 1:
+            self.diagnostic_counts[diagnostic.package][diagnostic.severity] += 1
+        return count
+
+    def get_diagnostic_summary(self, pkg=None):
+        """Return a short summary of the number of unique errors and warnings (from pkg, or from all packages)."""
+        if pkg is None:
+            counts = sum(self.diagnostic_counts.values(), collections.Counter())
+        else:
+            counts = self.diagnostic_counts.get(pkg, {})
+        return ' '.join(f'{severity[0].upper()}{counts[severity]}'
+                        for severity in ['error', 'warning'] if counts.get(severity))
 
     def add_error_line(self, line):
+        if self.error_log:
+            self.error_log.add_line(self.output_package, line)
+        self.buffer_error_line(line)
+        self.notify()
+
+    def buffer_error_line(self, line):
         self.error_buffer.append(line)
+        self.n_error_lines += 1
 
     def get_elapsed_time(self):
-        dt = time.time() - self.start_time
-        hours, remainder = divmod(dt, 3600)
-        minutes, seconds = divmod(remainder, 60)
-        if hours or minutes:
-            hours = int(hours)
-            minutes = int(minutes)
-            seconds = int(seconds)
-            s = f'{minutes:02d}:{seconds:02d}'
-            if hours:
-                return f'{hours}:' + s
-            else:
-                return s
-        else:
-            return f'{seconds:.1f} s'
+        return format_duration(time.time() - self.start_time)
+
+    def get_remaining_time(self):
+        """Estimate the number of seconds left in the build based on previous build durations.
+
+        The estimate is the larger of the longest remaining chain of dependencies
+        and the total remaining work divided among the workers. Returns None without previous build durations.
+        """
+        remaining = [pkg for state in ['blocked', 'queued', 'active'] for pkg in self.pkg_lists[state]]
+        if not remaining or not self.expected_durations:
+            return
+
+        default_duration = statistics.median(self.expected_durations.values())
+        now = time.time()
+        durations = {}
+        for pkg in remaining:
+            duration = self.expected_durations.get(pkg, default_duration)
+            if pkg in self.start_times:
+                duration = max(duration - (now - self.start_times[pkg]), 0.0)
+            durations[pkg] = duration
+
+        lengths = get_critical_path_lengths(set(remaining), self.dependencies, durations)
+        return max(max(lengths.values()), sum(durations.values()) / self.workers)
 
     def get_all_packages(self):
-        pkgs = []
-        for pkg_list in self.pkg_lists.values():
-            pkgs += pkg_list
-        return pkgs
+        return list(self.states)
+
+    def print_status(self, compact=False):
+        """Print the number of packages in each state (and their names, unless compact) and other statistics."""
+        import click
 
-    def print_status(self):
         n_fin = len(self.pkg_lists['finished'])
         dt = self.get_elapsed_time()
         click.secho('Summary: ', fg='white', bold=True, nl=False)
@@ -144,9 +386,48 @@ class BuildStatus:
                 continue
             n = len(pkgs)
             suffix = '' if n == 1 else 's'
-            pkgs_s = ' '.join(sorted(pkgs))
-            click.secho(f' {n:4} package{suffix} {category}', fg=STATUS_COLORS.get(category, 'white'), nl=False)
-            click.secho(f': {pkgs_s}')
+            click.secho(f' {n:4} package{suffix} {category}', fg=STATUS_COLORS.get(category, 'white'), nl=compact)
+            if not compact:
+                pkgs_s = ' '.join(sorted(pkgs))
+                click.secho(f': {pkgs_s}')
+        if compact:
+            return
+
+        repeated = [(diagnostic, count) for diagnostic, count in self.diagnostics.items() if count > 1]
+        if repeated:
+            click.secho('Most repeated diagnostics:', fg='white')
+            for diagnostic, count in sorted(repeated, key=lambda item: item[1], reverse=True)[:5]:
+                pkg_s = f'[{diagnostic.package}] ' if diagnostic.package else ''
+                click.secho(f' {count:5}x ', fg=STATUS_COLORS['failed'] if diagnostic.severity == 'error' else 'yellow',
+                            nl=False)
+                click.secho(f'{pkg_s}{diagnostic.file}:{diagnostic.line}: {diagnostic.message}')
+
+        critical_path = get_critical_path(set(self.durations), self.dependencies, self.durations)
+        if len(critical_path) > 1:
+            critical_s = format_duration(sum(self.durations[pkg] for pkg in critical_path))
+            click.secho(f'Critical path [{critical_s}]: ', fg='white', nl=False)
+            click.secho(' > '.join(critical_path))
+
+        if self.compiler_cache_stats:
+            hits, misses = self.compiler_cache_stats
+            total = hits + misses
+            if total:
+                click.secho('Compiler cache: ', fg='white', nl=False)
+                click.secho(f'{hits} hits, {misses} misses ({hits / total:.0%} hit rate)')
+
+
+def parse_diagnostic(line, package=None):
+    """Return a Diagnostic if the line is the first line of a compiler or CMake message, or None."""
+    if line.startswith('CMake '):
+        m = CMAKE_DIAGNOSTIC_PATTERN.match(line)
+    elif ': ' in line:
+        m = COMPILER_DIAGNOSTIC_PATTERN.match(line)
+    else:
+        return
+    if not m:
+        return
+    return Diagnostic(m.group('file'), int(m.group('line')), SEVERITIES[m.group('severity')], m.group('message'),
+                      package)
 
 
 def parse_colcon_graph(s):
@@ -211,6 +492,7 @@ async def get_catkin_tools_graph(workspace_root, package_selection_args):
                     stdout_callback=lambda line: stdout_callback(line), stderr_callback=stderr_callback)
 
     if ret != 0 or error_text:
+        import click
         click.secho(error_text, fg='red')
         raise RuntimeError('Error retrieving dependencies!')
 
@@ -221,17 +503,140 @@ async def get_catkin_tools_graph(workspace_root, package_selection_args):
     return upstream
 
 
+def parse_package_info(path):
+    from catkin_pkg.package import parse_package
+
+    package = parse_package(path)
+    package.evaluate_conditions(os.environ)
+
+    def get_names(dependencies):
+        return {dep.name for dep in dependencies if dep.evaluated_condition is not False}
+
+    deps = set()
+    for dep_type in BUILD_DEPENDENCY_TYPES:
+        deps.update(get_names(getattr(package, dep_type)))
+    return package.name, PackageInfo(path, deps, get_names(package.test_depends))
+
+
+def get_workspace_packages(workspace_root):
+    """Parse the package.xml files in the workspace and return a dictionary of PackageInfo keyed by package name.
+
+    Dependencies on packages outside of the workspace are dropped.
+    """
+    from catkin_pkg.package import InvalidPackage
+    from catkin_pkg.packages import find_package_paths
+
+    src_folder = get_source_folder(workspace_root)
+    paths = [os.path.join(src_folder, path) for path in find_package_paths(str(src_folder))]
+    try:
+        with ThreadPoolExecutor() as executor:
+            packages = dict(executor.map(parse_package_info, paths))
+    except InvalidPackage as e:
+        raise RuntimeError(f'Error parsing package: {e}')
+
+    for name, info in packages.items():
+        packages[name] = PackageInfo(info.path, info.deps & packages.keys(), info.test_deps & packages.keys())
+    return packages
+
+
+def get_upstream_closure(packages, roots):
+    """Return the roots and all the packages they depend on (recursively) to build and run."""
+    closure = set()
+    to_check = [pkg for pkg in roots if pkg in packages]
+    while to_check:
+        pkg = to_check.pop()
+        if pkg in closure:
+            continue
+        closure.add(pkg)
+        to_check += packages[pkg].deps
+    return closure
+
+
+def select_packages(packages, include_packages=None, skip_packages=None, no_deps=False):
+    """Return the upstream dependencies of each selected package, limited to the selected packages."""
+    if not include_packages:
+        selected = set(packages)
+    elif no_deps:
+        selected = set(include_packages) & packages.keys()
+    else:
+        selected = get_upstream_closure(packages, include_packages)
+
+    if skip_packages:
+        selected -= set(skip_packages)
+
+    return {pkg: (packages[pkg].deps | packages[pkg].test_deps) & selected for pkg in sorted(selected)}
+
+
+def parse_package_selection_args(package_selection_args):
+    """Convert the arguments from get_package_selection_args back to included/skipped packages and the no_deps flag."""
+    include_packages = []
+    skip_packages = []
+    no_deps = False
+    target = include_packages
+    for arg in package_selection_args:
+        if arg in ['--packages-select', '--pkg', '--no-deps']:
+            no_deps = True
+            target = include_packages
+        elif arg in ['--packages-up-to', '--only-pkg-with-deps']:
+            target = include_packages
+        elif arg == '--packages-skip':
+            target = skip_packages
+        elif arg.startswith('-DCATKIN_BLACKLIST_PACKAGES='):
+            skip_packages += arg.split('=', 1)[1].strip('"').split(';')
+        else:
+            target.append(arg)
+    return include_packages, skip_packages, no_deps
+
+
+async def get_native_graph(build_type, workspace_root, package_selection_args):
+    """Compute the dependency graph by parsing the package.xml files directly, rather than calling the build tool."""
+    include_packages, skip_packages, no_deps = parse_package_selection_args(package_selection_args)
+    loop = asyncio.get_event_loop()
+    packages = await loop.run_in_executor(None, get_workspace_packages, workspace_root)
+    return select_packages(packages, include_packages, skip_packages, no_deps)
+
+
+async def get_dependency_graph(build_type, workspace_root, package_selection_args):
+    """Return the upstream dependencies of each package to be built.
+
+    The result is cached, and only recomputed when the package.xml files in the workspace change.
+    The conditional dependencies depend on the ROS version, so it is part of the cache key.
+    """
+    from ros_command.cache import get_cache
+
+    native = get_config('native_dependency_graph', True, workspace_root)
+    cache_keys = [str(workspace_root), 'dependency_graph', str(build_type), str(native),
+                  os.environ.get('ROS_VERSION', ''), os.environ.get('ROS_DISTRO', '')] + package_selection_args
+    # Finding the package.xml files walks the whole source folder, so it is not done on the event loop
+    loop = asyncio.get_event_loop()
+    fingerprint = await loop.run_in_executor(None, get_manifest_fingerprint, get_source_folder(workspace_root))
+    entry = get_cache().get(cache_keys)
+    if entry is not None and entry[1] == fingerprint:
+        return {pkg: set(deps) for pkg, deps in entry[2].items()}
+
+    if native:
+        upstream = await get_native_graph(build_type, workspace_root, package_selection_args)
+    elif build_type == BuildType.COLCON:
+        upstream = await get_colcon_graph(workspace_root, package_selection_args)
+    else:
+        upstream = await get_catkin_tools_graph(workspace_root, package_selection_args)
+
+    get_cache().set(cache_keys, {pkg: sorted(deps) for pkg, deps in upstream.items()}, fingerprint=fingerprint)
+    return upstream
+
+
 def add_package_selection_args(parser, workspace_root=None):
     completer = LocalPackageCompleter(workspace_root)
 
     parser.add_argument('--this', action='store_true')
     parser.add_argument('-n', '--no-deps', action='store_true')
     parser.add_argument('-s', '--skip-packages', nargs='+').completer = completer
+    parser.add_argument('--changed-since', metavar='REF')
     parser.add_argument('include_packages', metavar='include_package', nargs='*').completer = completer
     return parser
 
 
-def get_package_selection_args(args, build_type, pkg_name):
+def get_package_selection_args(args, build_type, pkg_name, workspace_root=None):
     package_selection_args = []
 
     if args.this and not pkg_name:
@@ -239,6 +644,20 @@ def get_package_selection_args(args, build_type, pkg_name):
     elif args.no_deps and not (args.this or args.include_packages):
         raise RuntimeError('With --no-deps, you must specify packages to build.')
 
+    if args.changed_since:
+        from ros_command.changes import get_affected_packages
+
+        # Build exactly the affected packages, since everything upstream of them is unchanged
+        affected = get_affected_packages(workspace_root, args.changed_since)
+        if args.this:
+            affected.add(pkg_name)
+        affected.update(args.include_packages or [])
+        if not affected:
+            raise RuntimeError(f'No packages changed since {args.changed_since}')
+        args.this = False
+        args.include_packages = sorted(affected)
+        args.no_deps = True
+
     if build_type == BuildType.COLCON:
         if args.no_deps:
             package_selection_args.append('--packages-select')
@@ -280,13 +699,22 @@ def get_package_selection_args(args, build_type, pkg_name):
 
 
 def generate_build_command(build_type, unknown_args, package_selection_args=[], continue_on_failure=False, jobs=None,
-                           cmake_build_type=None, workspace_root=None):
+                           cmake_build_type=None, workspace_root=None, make_jobs=None):
+    """Return the build command.
+
+    jobs is the number of packages to build in parallel. If make_jobs (the number of make jobs for each package) is
+    also specified, the tools that control the total number of make jobs themselves are given jobs * make_jobs.
+    """
     cmake_args = []
     if cmake_build_type is None:
         cmake_build_type = get_config('cmake_build_type', 'Release', workspace_root)
     if cmake_build_type:
         cmake_args.append(f'-DCMAKE_BUILD_TYPE={cmake_build_type}')
 
+    compiler_cache = get_compiler_cache(workspace_root)
+    if compiler_cache:
+        cmake_args += get_launcher_args(compiler_cache)
+
     cmake_args += get_config('extra_cmake_args', [], workspace_root)
     extra_build_args = get_config('extra_build_args', [], workspace_root)
 
@@ -306,7 +734,9 @@ def generate_build_command(build_type, unknown_args, package_selection_args=[],
         if continue_on_failure:
             command.append('--continue-on-failure')
         command += package_selection_args
-        if jobs is not None:
+        if jobs is not None and make_jobs is not None:
+            command += ['--parallel-packages', str(jobs), '--jobs', str(jobs * make_jobs)]
+        elif jobs is not None:
             command += ['--jobs', str(jobs)]
         command += unknown_args + extra_build_args
         if cmake_args:
@@ -317,7 +747,8 @@ def generate_build_command(build_type, unknown_args, package_selection_args=[],
             raise NotImplementedError()
         command += package_selection_args
         if jobs is not None:
-            command += ['--jobs', str(jobs)]
+            # catkin_make builds the whole workspace as one project, so its jobs are all make jobs
+            command += ['--jobs', str(jobs * make_jobs if make_jobs is not None else jobs)]
         command += unknown_args + extra_build_args
         command += cmake_args
     else:
@@ -325,43 +756,200 @@ def generate_build_command(build_type, unknown_args, package_selection_args=[],
     return command
 
 
+def add_skipped_packages(package_selection_args, packages):
+    """Return a copy of the (colcon) package selection args with the packages added to --packages-skip."""
+    package_selection_args = list(package_selection_args)
+    packages = sorted(packages)
+    if '--packages-skip' in package_selection_args:
+        i = package_selection_args.index('--packages-skip') + 1
+        package_selection_args[i:i] = packages
+    elif packages:
+        package_selection_args += ['--packages-skip'] + packages
+    return package_selection_args
+
+
+async def detect_unchanged_packages(build_type, workspace_root, package_selection_args, build_args):
+    """Return the signatures of the packages to build and the set of packages that are unchanged since last built."""
+    from ros_command.incremental import get_package_signatures, get_unchanged_packages
+
+    upstream = await get_dependency_graph(build_type, workspace_root, package_selection_args)
+    signatures = get_package_signatures(workspace_root, upstream, build_args)
+    signatures = {pkg: signature for pkg, signature in signatures.items() if pkg in upstream}
+    return signatures, get_unchanged_packages(workspace_root, signatures)
+
+
+def get_build_environment(build_type, workspace_root, make_jobs=None):
+    """Return the environment variables to set for the build command (in addition to the current environment)."""
+    env = {}
+    compiler_cache = get_compiler_cache(workspace_root)
+    if compiler_cache:
+        env.update(get_cache_environment(compiler_cache, workspace_root))
+    # catkin_tools and catkin_make get the make jobs in the build command
+    if make_jobs is not None and build_type == BuildType.COLCON:
+        env['MAKEFLAGS'] = f'-j{make_jobs}'
+    return env
+
+
 async def run_build_command(build_type, workspace_root, extra_args=[], package_selection_args=[],
                             continue_on_failure=True, jobs=None, cmake_build_type=None, toggle_graphics=False,
-                            return_build_status=False):
-    command = generate_build_command(build_type, extra_args, package_selection_args, continue_on_failure, jobs,
-                                     cmake_build_type, workspace_root)
-    stdout_callback = None
-    stderr_callback = None
+                            return_build_status=False, make_jobs=None, skip_unchanged=False, distribute=None,
+                            events=None, trace=None):
+    signatures = {}
+    unchanged = set()
+    build_package_selection_args = package_selection_args
+    phases = []
+    if skip_unchanged and build_type == BuildType.COLCON:
+        phase_start = time.time()
+        # Everything in the command except the package selection affects the build results
+        build_args = generate_build_command(build_type, extra_args, [], False, None, cmake_build_type, workspace_root)
+        try:
+            signatures, unchanged = await detect_unchanged_packages(build_type, workspace_root, package_selection_args,
+                                                                    build_args)
+        except RuntimeError:
+            pass
+        if unchanged:
+            import click
+            n = len(unchanged)
+            click.secho(f'Skipping {n} unchanged package{"" if n == 1 else "s"} (use --force to rebuild)', fg='cyan')
+            build_package_selection_args = add_skipped_packages(package_selection_args, unchanged)
+        phases.append(('unchanged package detection', phase_start, time.time()))
+
+    command = generate_build_command(build_type, extra_args, build_package_selection_args, continue_on_failure, jobs,
+                                     cmake_build_type, workspace_root, make_jobs)
+    build_env = get_build_environment(build_type, workspace_root, make_jobs)
+    env = dict(os.environ, **build_env) if build_env else None
+    compiler_cache = get_compiler_cache(workspace_root)
+    cache_stats_before = await get_cache_stats(compiler_cache, env) if compiler_cache else None
+    stdout_batch_callback = None
+    stderr_batch_callback = None
+    dependency_task = None
 
     graphic_build = get_config('graphic_build', True)
     if toggle_graphics:
         graphic_build = not graphic_build
 
-    if graphic_build and build_type != BuildType.CATKIN_MAKE:
-        build_status = BuildStatus()
-        display = BuildStatusDisplay(build_status)
-        if build_type == BuildType.COLCON:
-            build_status.set_dependencies(await get_colcon_graph(workspace_root, package_selection_args))
-            stdout_callback = build_status.out_callback
-            stderr_callback = build_status.err_callback
-        elif build_type == BuildType.CATKIN_TOOLS:
-            build_status.set_dependencies(await get_catkin_tools_graph(workspace_root, package_selection_args))
-            stdout_callback = build_status.out_callback
-            stderr_callback = build_status.err_callback
-    else:
-        # Graphical interface not implemented for catkin_make
-        build_status = None
-        display = None
+    build_status = None
+    display = None
+    event_writer = None
+    # Status tracking not implemented for catkin_make
+    if (graphic_build or events or trace) and build_type != BuildType.CATKIN_MAKE:
+        from ros_command.error_log import ErrorLog
+
+        build_status = BuildStatus(load_durations(workspace_root), jobs * (distribute or 1) if jobs else None,
+                                   ErrorLog(workspace_root))
+        build_status.phases += phases
+        memory_sampler = MemorySampler(build_status, workspace_root)
+        if events:
+            from ros_command.build_events import BuildEventWriter
+            event_writer = BuildEventWriter(events, build_status)
+
+        async def query_dependencies():
+            phase_start = time.time()
+            try:
+                upstream = await get_dependency_graph(build_type, workspace_root, package_selection_args)
+            except RuntimeError as e:
+                build_status.add_error_line(str(e))
+                upstream = {}
+            upstream = {pkg: deps for pkg, deps in upstream.items() if pkg not in unchanged}
+            build_status.phases.append(('dependency graph', phase_start, time.time()))
+            if event_writer:
+                event_writer.start(sorted(upstream), unchanged)
+            build_status.set_dependencies(upstream)
+
+        # Compute the dependencies while the build starts
+        dependency_task = asyncio.ensure_future(query_dependencies())
+
+        if graphic_build:
+            if sys.stdout.isatty():
+                from ros_command.build_status_display import BuildStatusDisplay
+                display = BuildStatusDisplay(build_status)
+            else:
+                # Avoid filling logs with terminal redraws
+                from ros_command.headless_display import HeadlessStatusDisplay
+                display = HeadlessStatusDisplay(build_status)
+            stdout_batch_callback = build_status.out_batch_callback
+            stderr_batch_callback = build_status.err_batch_callback
+        else:
+            import click
+
+            # Show the raw output as well
+            def stdout_batch_callback(lines):
+                click.echo(''.join(lines), nl=False)
+                build_status.out_batch_callback(lines)
+
+            def stderr_batch_callback(lines):
+                click.secho(''.join(lines), fg='red', nl=False)
+                build_status.err_batch_callback(lines)
+
+    if distribute and build_type == BuildType.COLCON:
+        from ros_command.distributed import run_distributed
+
+        upstream = await get_dependency_graph(build_type, workspace_root, build_package_selection_args)
 
-    code = await run(command, cwd=workspace_root,
-                     stdout_callback=stdout_callback, stderr_callback=stderr_callback)
+        def generate_worker_command(worker_selection_args):
+            return generate_build_command(build_type, extra_args, worker_selection_args, continue_on_failure, jobs,
+                                          cmake_build_type, workspace_root, make_jobs)
+
+        code = await run_distributed(upstream, distribute, generate_worker_command, cwd=workspace_root, env=env,
+                                     stdout_batch_callback=stdout_batch_callback,
+                                     stderr_batch_callback=stderr_batch_callback,
+                                     continue_on_failure=continue_on_failure,
+                                     expected_durations=load_durations(workspace_root))
+    else:
+        code = await run(command, cwd=workspace_root, stdout_batch_callback=stdout_batch_callback,
+                         stderr_batch_callback=stderr_batch_callback, env=env)
+    if dependency_task:
+        await dependency_task
+
+    if build_status and cache_stats_before:
+        cache_stats_after = await get_cache_stats(compiler_cache, env)
+        if cache_stats_after:
+            build_status.compiler_cache_stats = tuple(b - a for a, b in zip(cache_stats_before, cache_stats_after))
+
+    if build_status:
+        memory_sampler.stop()
+        if build_status.pending_diagnostic:
+            build_status.add_pending_diagnostic()
+        build_status.error_log.close()
+        if event_writer:
+            event_writer.finish(code)
+        if trace:
+            from ros_command.build_trace import write_trace
+            write_trace(trace, build_status, workspace_root)
 
     if display:
         display.finish()
+        n_hidden = build_status.n_error_lines - len(build_status.error_buffer)
+        if n_hidden:
+            print(f'[{n_hidden} earlier lines omitted, see rosbuild --last-errors]', file=sys.stderr)
         for line in build_status.error_buffer:
             print(line, file=sys.stderr)
         build_status.print_status()
 
+    if build_status:
+        save_durations(workspace_root, build_status.durations)
+        if cmake_build_type is None:
+            cmake_build_type = get_config('cmake_build_type', 'Release', workspace_root)
+        import sqlite3
+
+        try:
+            recorded = BuildHistory().record_build(workspace_root, build_status, code, cmake_build_type)
+        except sqlite3.OperationalError:
+            recorded = False
+        if not recorded:
+            print('Could not record the build in the build history (database is locked)', file=sys.stderr)
+
+    if signatures:
+        from ros_command.incremental import save_signatures
+
+        if build_status:
+            built = set(build_status.pkg_lists['finished'])
+        elif code == 0:
+            built = set(signatures)
+        else:
+            built = set()
+        save_signatures(workspace_root, {pkg: signatures[pkg] for pkg in signatures if pkg in built})
+
     if return_build_status:
         return code, build_status
     else:
@@ -0,0 +1,131 @@
+"""Export a build in the Trace Event Format, for viewing in chrome://tracing or Perfetto.
+
+Each package is a span on a worker lane, with the configure/build/install commands from colcon's event log
+(if available) nested inside it. The phases of rosbuild itself (i.e. querying the dependency graph) are on lane 0.
+"""
+import ast
+import json
+import os
+import re
+import statistics
+import time
+
+COLCON_EVENT_PATTERN = re.compile(r'\[(?P<time>[\d\.]+)\] \((?P<pkg>[^\)]+)\) (?P<name>\w+): (?P<data>.*)')
+COMMAND_PATTERN = re.compile(r"'cmd': (\[[^\]]*\])")
+PID = 1
+
+
+def get_lanes(spans):
+    """Assign each (pkg, start, stop) span to the first lane (numbered from 1) that is free when it starts."""
+    lane_ends = []
+    lanes = {}
+    for pkg, start, stop in sorted(spans, key=lambda span: span[1]):
+        for i, end in enumerate(lane_ends):
+            if end <= start:
+                break
+        else:
+            i = len(lane_ends)
+            lane_ends.append(None)
+        lane_ends[i] = stop
+        lanes[pkg] = i + 1
+    return lanes
+
+
+def get_command_phase(cmd):
+    name = os.path.basename(cmd[0]) if cmd else 'command'
+    if name == 'cmake':
+        if '--build' in cmd:
+            return 'build'
+        elif '--install' in cmd:
+            return 'install'
+        return 'configure'
+    return name
+
+
+def parse_colcon_events(path):
+    """Return the JobStarted times and the (pkg, phase, start, stop) commands in a colcon events.log file.
+
+    The times are in seconds relative to the start of colcon.
+    """
+    job_starts = {}
+    commands = []
+    running = {}
+    with open(path, errors='replace') as f:
+        for line in f:
+            m = COLCON_EVENT_PATTERN.match(line)
+            if not m:
+                continue
+            stamp = float(m.group('time'))
+            pkg = m.group('pkg')
+            name = m.group('name')
+            if name == 'JobStarted':
+                job_starts[pkg] = stamp
+            elif name in ['Command', 'CommandEnded']:
+                m_cmd = COMMAND_PATTERN.search(m.group('data'))
+                try:
+                    cmd = ast.literal_eval(m_cmd.group(1)) if m_cmd else []
+                except (ValueError, SyntaxError):
+                    cmd = []
+                if name == 'Command':
+                    running[pkg] = get_command_phase(cmd), stamp
+                elif pkg in running:
+                    phase, start = running.pop(pkg)
+                    commands.append((pkg, phase, start, stamp))
+    return job_starts, commands
+
+
+def get_colcon_event_logs(workspace_root, start_time):
+    """Return the colcon event logs written during the build (including the ones from rosbuild --distribute)."""
+    log_base = workspace_root / 'log'
+    paths = [log_base / 'latest_build' / 'events.log']
+    if log_base.exists():
+        paths += [folder / 'latest_build' / 'events.log' for folder in sorted(log_base.glob('worker_*'))]
+    return [path for path in paths if path.exists() and path.stat().st_mtime >= start_time]
+
+
+def get_trace_events(status, workspace_root=None):
+    now = time.time()
+    spans = [(pkg, start, status.stop_times.get(pkg, now)) for pkg, start in status.start_times.items()]
+    lanes = get_lanes(spans)
+    # The phases before the build command starts are included too
+    origin = min([status.start_time] + [phase[1] for phase in status.phases])
+
+    def span(name, category, tid, start, stop, args=None):
+        event = {'name': name, 'cat': category, 'ph': 'X', 'pid': PID, 'tid': tid,
+                 'ts': (start - origin) * 1e6, 'dur': max(stop - start, 0.0) * 1e6}
+        if args:
+            event['args'] = args
+        return event
+
+    events = [{'name': 'process_name', 'ph': 'M', 'pid': PID, 'args': {'name': 'rosbuild'}},
+              {'name': 'thread_name', 'ph': 'M', 'pid': PID, 'tid': 0, 'args': {'name': 'rosbuild'}}]
+    for lane in sorted(set(lanes.values())):
+        events.append({'name': 'thread_name', 'ph': 'M', 'pid': PID, 'tid': lane, 'args': {'name': f'worker {lane}'}})
+
+    for name, start, stop in status.phases:
+        events.append(span(name, 'rosbuild', 0, start, stop))
+
+    for pkg, start, stop in spans:
+        counts = status.diagnostic_counts.get(pkg, {})
+        args = {'result': status.states.get(pkg), 'errors': counts.get('error', 0),
+                'warnings': counts.get('warning', 0)}
+        events.append(span(pkg, 'package', lanes[pkg], start, stop, args))
+
+    if workspace_root:
+        for path in get_colcon_event_logs(workspace_root, status.start_time):
+            job_starts, commands = parse_colcon_events(path)
+            # Align colcon's relative times with the times the packages were reported as starting
+            offsets = [status.start_times[pkg] - stamp for pkg, stamp in job_starts.items()
+                       if pkg in status.start_times]
+            if not offsets:
+                continue
+            offset = statistics.median(offsets)
+            for pkg, phase, start, stop in commands:
+                if pkg in lanes:
+                    events.append(span(phase, 'phase', lanes[pkg], start + offset, stop + offset))
+    return events
+
+
+def write_trace(path, status, workspace_root=None):
+    with open(path, 'w') as f:
+        json.dump({'traceEvents': get_trace_events(status, workspace_root), 'displayTimeUnit': 'ms'}, f)
@@ -0,0 +1,119 @@
+import json
+import pathlib
+import sqlite3
+import time
+
+CACHE_PATH = pathlib.Path('~/.ros/ros_command_cache.db').expanduser()
+LEGACY_CACHE_PATH = pathlib.Path('~/.ros/ros_command_cache.yaml').expanduser()
+SCHEMA_VERSION = 2
+
+
+class Cache:
+    """Key-value store backed by SQLite, so that each lookup only reads the requested entry.
+
+    Entries that have been read or written are also kept in memory, which helps long-running processes.
+
+    Keys are lists of strings (i.e. [workspace_root, package_name, 'executables']).
+    Values are any json-serializable data, stored along with the time they were written
+    and an optional json-serializable fingerprint used to check whether they are still valid.
+    """
+
+    def __init__(self, path=CACHE_PATH, legacy_path=LEGACY_CACHE_PATH):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        is_new = not path.exists()
+        self.conn = sqlite3.connect(str(path), timeout=1.0)
+        self.memory = {}
+
+        if self.get_schema_version() != SCHEMA_VERSION:
+            # Other processes (i.e. tab completions) may be resetting the schema at the same time,
+            # so take the write lock and check again before changing it
+            with self.conn:
+                self.conn.execute('BEGIN IMMEDIATE')
+                if self.get_schema_version() != SCHEMA_VERSION:
+                    # Cached values can always be regenerated, so just start over
+                    self.conn.execute('DROP TABLE IF EXISTS entries')
+                    self.conn.execute('CREATE TABLE IF NOT EXISTS entries '
+                                      '(key TEXT PRIMARY KEY, stamp REAL, fingerprint TEXT, data TEXT)')
+                    self.conn.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
+
+        if is_new and legacy_path and legacy_path.exists():
+            self.migrate_yaml(legacy_path)
+
+    def get_schema_version(self):
+        return self.conn.execute('PRAGMA user_version').fetchone()[0]
+
+    @staticmethod
+    def encode_key(keys):
+        return json.dumps([str(key) for key in keys])
+
+    def get(self, keys):
+        """Return a tuple of the stamp, fingerprint and data for the given keys, or None if not present."""
+        key = self.encode_key(keys)
+        if key in self.memory:
+            return self.memory[key]
+
+        row = self.conn.execute('SELECT stamp, fingerprint, data FROM entries WHERE key = ?', (key,)).fetchone()
+        if row is None:
+            return
+        stamp, fingerprint, data = row
+        entry = stamp, json.loads(fingerprint), json.loads(data)
+        self.memory[key] = entry
+        return entry
+
+    def set(self, keys, data, stamp=None, fingerprint=None, commit=True):
+        if stamp is None:
+            stamp = time.time()
+        key = self.encode_key(keys)
+        fingerprint_s = json.dumps(fingerprint)
+        data_s = json.dumps(data)
+        # Round trip through json so the in-memory version matches what is read from the database
+        self.memory[key] = stamp, json.loads(fingerprint_s), json.loads(data_s)
+        try:
+            self.conn.execute('INSERT OR REPLACE INTO entries (key, stamp, fingerprint, data) VALUES (?, ?, ?, ?)',
+                              (key, stamp, fingerprint_s, data_s))
+            if commit:
+                self.conn.commit()
+        except sqlite3.OperationalError:
+            # Database is locked by another process. Skip writing, since it is only a cache.
+            self.conn.rollback()
+
+    def commit(self):
+        """Commit the entries written with commit=False."""
+        try:
+            self.conn.commit()
+        except sqlite3.OperationalError:
+            self.conn.rollback()
+
+    def migrate_yaml(self, legacy_path):
+        """Import the entries from the old monolithic yaml cache file."""
+        import yaml
+
+        try:
+            legacy_cache = yaml.safe_load(open(legacy_path)) or {}
+        except yaml.YAMLError:
+            return
+
+        for keys, entry in walk_legacy_cache(legacy_cache):
+            stamp = entry['stamp']
+            if hasattr(stamp, 'timestamp'):
+                stamp = stamp.timestamp()
+            self.set(keys, entry['data'], stamp, commit=False)
+        self.conn.commit()
+
+
+def walk_legacy_cache(d, keys=[]):
+    if 'data' in d and 'stamp' in d:
+        yield keys, d
+    for key, value in d.items():
+        if isinstance(value, dict):
+            yield from walk_legacy_cache(value, keys + [key])
+
+
+THE_CACHE = None
+
+
+def get_cache():
+    global THE_CACHE
+    if THE_CACHE is None:
+        THE_CACHE = Cache()
+    return THE_CACHE
@@ -0,0 +1,88 @@
+"""Find the packages in a workspace affected by the changes in its git repositories."""
+import os
+import pathlib
+import subprocess
+
+
+def find_git_repos(workspace_root, src_folder):
+    """Return the roots of the git repositories containing the source code."""
+    if (workspace_root / '.git').exists():
+        return [workspace_root]
+
+    repos = []
+    for folder, subfolders, filenames in os.walk(src_folder):
+        if '.git' in subfolders or '.git' in filenames:
+            repos.append(pathlib.Path(folder))
+            subfolders[:] = []
+        else:
+            subfolders[:] = [name for name in subfolders if name[0] != '.']
+    return repos
+
+
+def get_changed_files(repo, ref):
+    """Return the absolute paths of the files that differ from ref (including uncommitted and untracked files).
+
+    Returns None if ref is not valid in the repository.
+    """
+    changed = []
+    for command in [['git', 'diff', '--name-only', ref, '--'], ['git', 'ls-files', '--others', '--exclude-standard']]:
+        result = subprocess.run(command, cwd=repo, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+        if result.returncode != 0:
+            return
+        changed += [repo / line for line in result.stdout.splitlines() if line]
+    return changed
+
+
+def get_owning_package(path, package_paths):
+    """Return the name of the package containing the path, or None."""
+    for parent in path.parents:
+        if parent in package_paths:
+            return package_paths[parent]
+
+
+def get_downstream_closure(packages, roots):
+    """Return the roots and all the packages that depend on them (recursively)."""
+    downstream = {pkg: set() for pkg in packages}
+    for pkg, info in packages.items():
+        for dep in info.deps | info.test_deps:
+            downstream[dep].add(pkg)
+
+    closure = set()
+    to_check = list(roots)
+    while to_check:
+        pkg = to_check.pop()
+        if pkg in closure:
+            continue
+        closure.add(pkg)
+        to_check += downstream[pkg]
+    return closure
+
+
+def get_affected_packages(workspace_root, ref):
+    """Return the packages with files changed since the git ref, and everything downstream of them."""
+    import click
+
+    from ros_command.build_tool import get_workspace_packages
+    from ros_command.packages import get_source_folder
+
+    packages = get_workspace_packages(workspace_root)
+    package_paths = {pathlib.Path(info.path).resolve(): pkg for pkg, info in packages.items()}
+
+    changed = set()
+    repos = find_git_repos(workspace_root, get_source_folder(workspace_root))
+    valid_repos = 0
+    for repo in repos:
+        changed_files = get_changed_files(repo, ref)
+        if changed_files is None:
+            click.secho(f'Cannot compare {repo} with {ref}', fg='yellow', err=True)
+            continue
+        valid_repos += 1
+        for path in changed_files:
+            pkg = get_owning_package(path.resolve(), package_paths)
+            if pkg:
+                changed.add(pkg)
+
+    if not valid_repos:
+        raise RuntimeError(f'No git repositories in the workspace contain {ref}')
+
+    return get_downstream_closure(packages, changed)
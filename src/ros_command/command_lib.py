@@ -1,50 +1,127 @@
 import asyncio
 from asyncio import create_subprocess_exec
 from asyncio.subprocess import DEVNULL, PIPE
+import os
 import pathlib
 import sys
 
-import click
+from ros_command.util import get_config
 
 # Brought to you by https://stackoverflow.com/questions/803265/getting-realtime-output-using-subprocess
 
+CHUNK_SIZE = 1 << 16
+DEFAULT_MAX_LINE_LENGTH = 1 << 16
 
-async def _read_stream(stream, callback, encoding='UTF8'):
+
+async def _read_stream(stream, batch_callback, max_line_length, encoding='UTF8'):
+    """Read the stream in large chunks and pass the lines to the callback in batches.
+
+    Each line includes its newline character. Lines longer than max_line_length are split into multiple lines.
+    """
+    remainder = b''
     while True:
-        line = await stream.readline()
-        if line:
-            callback(line.decode(encoding))
-        else:
+        chunk = await stream.read(CHUNK_SIZE)
+        if not chunk:
             break
+        complete, newline, remainder = (remainder + chunk).rpartition(b'\n')
+
+        lines = []
+        if newline:
+            for line in complete.decode(encoding, errors='replace').split('\n'):
+                _split_long_line(line + '\n', max_line_length, lines)
+
+        # Do not let an incomplete line grow without bound
+        while len(remainder) > max_line_length:
+            lines.append(remainder[:max_line_length].decode(encoding, errors='replace'))
+            remainder = remainder[max_line_length:]
+
+        if lines:
+            batch_callback(lines)
+
+    if remainder:
+        lines = []
+        _split_long_line(remainder.decode(encoding, errors='replace'), max_line_length, lines)
+        batch_callback(lines)
+
+
+def _split_long_line(line, max_line_length, lines):
+    if len(line) <= max_line_length:
+        lines.append(line)
+        return
+    for i in range(0, len(line), max_line_length):
+        lines.append(line[i:i + max_line_length])
+
 
+def _line_by_line(callback):
+    """Adapt a callback for a single line to the batch callback API."""
+    def batch_callback(lines):
+        for line in lines:
+            callback(line)
+    return batch_callback
 
-def _default_stdout_callback(line):
+
+def _default_stdout_callback(lines):
     """Default callback for stdout that just prints."""
-    click.echo(line, nl=False)
+    import click
+    click.echo(''.join(lines), nl=False)
 
 
-def _default_stderr_callback(line):
+def _default_stderr_callback(lines):
     """Default callback for stderr that prints to stdout in red."""
-    click.secho(line, fg='red', nl=False)
+    import click
+    click.secho(''.join(lines), fg='red', nl=False)
+
 
+async def run(command, stdout_callback=None, stderr_callback=None, cwd=None,
+              stdout_batch_callback=None, stderr_batch_callback=None, max_line_length=None, env=None):
+    """Run a command (array of strings) and process its output with callbacks.
 
-async def run(command, stdout_callback=None, stderr_callback=None, cwd=None):
-    """Run a command (array of strings) and process its output with callbacks."""
+    The output can be processed one line at a time with stdout_callback/stderr_callback,
+    or with stdout_batch_callback/stderr_batch_callback, which are called with lists of lines.
+    """
     process = await create_subprocess_exec(
-        *command, stdout=PIPE, stderr=PIPE, cwd=cwd
+        *command, stdout=PIPE, stderr=PIPE, cwd=cwd, env=env
     )
 
-    if stdout_callback is None:
-        stdout_callback = _default_stdout_callback
-    if stderr_callback is None:
-        stderr_callback = _default_stderr_callback
+    if stdout_batch_callback is None:
+        if stdout_callback is None:
+            stdout_batch_callback = _default_stdout_callback
+        else:
+            stdout_batch_callback = _line_by_line(stdout_callback)
+    if stderr_batch_callback is None:
+        if stderr_callback is None:
+            stderr_batch_callback = _default_stderr_callback
+        else:
+            stderr_batch_callback = _line_by_line(stderr_callback)
+    if max_line_length is None:
+        max_line_length = get_config('max_line_length', DEFAULT_MAX_LINE_LENGTH)
 
-    await asyncio.wait([asyncio.create_task(_read_stream(process.stdout, stdout_callback)),
-                        asyncio.create_task(_read_stream(process.stderr, stderr_callback))])
+    await asyncio.wait([asyncio.create_task(_read_stream(process.stdout, stdout_batch_callback, max_line_length)),
+                        asyncio.create_task(_read_stream(process.stderr, stderr_batch_callback, max_line_length))])
 
     return await process.wait()
 
 
+def exec_command(command, cwd=None):
+    """Replace the current process with the command (array of strings)."""
+    sys.stdout.flush()
+    sys.stderr.flush()
+    if cwd:
+        os.chdir(cwd)
+    os.execvp(command[0], command)
+
+
+async def run_passthrough(command, cwd=None, workspace_root=None):
+    """Run a command (array of strings) whose output does not need to be processed.
+
+    Unless configured otherwise, the command replaces the current process,
+    giving it direct access to the terminal (and signals) without relaying its output through Python.
+    """
+    if get_config('exec_passthrough', True, workspace_root):
+        exec_command(command, cwd=cwd)
+    return await run(command, cwd=cwd)
+
+
 async def run_silently(command, cwd=None):
     """Run a command (array of strings) and hide all output."""
     process = await create_subprocess_exec(
@@ -54,17 +131,12 @@ async def run_silently(command, cwd=None):
     return await process.wait()
 
 
-async def get_output(command, cwd=None):
+async def get_output(command, cwd=None, env=None):
     """Run a command (array of strings) and return its standard output and error."""
     out = []
     err = []
 
-    def gather_callback(lines, line):
-        lines.append(line)
-
-    ret = await run(command, cwd=cwd,
-                    stdout_callback=lambda line: gather_callback(out, line),
-                    stderr_callback=lambda line: gather_callback(err, line))
+    ret = await run(command, cwd=cwd, stdout_batch_callback=out.extend, stderr_batch_callback=err.extend, env=env)
 
     return ret, ''.join(out), ''.join(err)
 
@@ -1,4 +1,3 @@
-import argcomplete
 import argparse
 import asyncio
 import sys
@@ -7,6 +6,7 @@ from betsy_ros import BuildType, get_workspace_root
 
 from ros_command.command_lib import get_output
 from ros_command.completion import PackageCompleter
+from ros_command.util import autocomplete
 
 
 async def main():
@@ -15,7 +15,7 @@ async def main():
     parser = argparse.ArgumentParser()
     parser.add_argument('package', nargs='?').completer = PackageCompleter(workspace_root)
 
-    argcomplete.autocomplete(parser)
+    autocomplete(parser)
 
     args = parser.parse_args()
 
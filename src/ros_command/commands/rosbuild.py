@@ -1,4 +1,3 @@
-import argcomplete
 import argparse
 import asyncio
 import os
@@ -6,9 +5,15 @@ import os
 from betsy_ros import BuildType, get_package_name_from_path, get_workspace_root
 
 from ros_command.build_tool import add_package_selection_args, generate_build_command, get_package_selection_args
-from ros_command.build_tool import run_build_command
+from ros_command.build_tool import get_build_environment, run_build_command
 from ros_command.command_lib import run
-from ros_command.util import get_config
+from ros_command.util import autocomplete, get_config
+
+
+def parse_jobs(s):
+    if s == 'auto':
+        return s
+    return int(s)
 
 
 async def main():
@@ -16,16 +21,31 @@ async def main():
 
     parser = argparse.ArgumentParser()
     parser.add_argument('-c', '--continue-on-failure', action='store_true')
-    parser.add_argument('-j', '--jobs', type=int)
+    parser.add_argument('-j', '--jobs', type=parse_jobs, default=get_config('jobs', workspace_root=workspace_root))
     parser.add_argument('-b', '--cmake-build-type', choices=['Debug', 'Release', 'RelWithDebInfo'])
     parser.add_argument('-t', '--test', action='store_true')
     parser.add_argument('-g', '--toggle-graphics', action='store_true')
+    parser.add_argument('--stats', action='store_true')
+    parser.add_argument('--last-errors', nargs='?', const='', metavar='PKG')
+    parser.add_argument('--force', action='store_true')
+    parser.add_argument('--distribute', type=int, metavar='N')
+    parser.add_argument('--events', metavar='TARGET')
+    parser.add_argument('--trace', metavar='PATH')
     add_package_selection_args(parser, workspace_root)
 
-    argcomplete.autocomplete(parser, always_complete_options=False)
+    autocomplete(parser, always_complete_options=False)
 
     args, unknown_args = parser.parse_known_args()
 
+    if args.stats:
+        from ros_command.build_history import print_stats
+        print_stats(workspace_root)
+        exit(0)
+    elif args.last_errors is not None:
+        from ros_command.error_log import show_last_errors
+        show_last_errors(workspace_root, args.last_errors or None)
+        exit(0)
+
     if build_type is None:
         ros_version = int(os.environ.get('ROS_VERSION', 1))
         if ros_version == 2:
@@ -33,19 +53,33 @@ async def main():
         else:
             build_type = BuildType.CATKIN_TOOLS  # Defaults to catkin tools
 
+    if args.distribute and build_type != BuildType.COLCON:
+        parser.error('--distribute is only supported with colcon')
+
     pkg_name = get_package_name_from_path()
 
-    package_selection_args = get_package_selection_args(args, build_type, pkg_name)
+    package_selection_args = get_package_selection_args(args, build_type, pkg_name, workspace_root)
+
+    skip_unchanged = get_config('skip_unchanged_packages', True, workspace_root) and not args.force
+
+    make_jobs = None
+    if args.jobs == 'auto':
+        from ros_command.build_history import get_automatic_jobs
+        args.jobs, make_jobs = get_automatic_jobs(workspace_root)
 
     if args.test:
         command = generate_build_command(build_type, unknown_args, package_selection_args,
-                                         args.continue_on_failure, args.jobs, args.cmake_build_type, workspace_root)
-        print(' '.join(command))
+                                         args.continue_on_failure, args.jobs, args.cmake_build_type, workspace_root,
+                                         make_jobs)
+        env_s = ''.join(f'{k}={v} ' for k, v in get_build_environment(build_type, workspace_root, make_jobs).items())
+        print(env_s + ' '.join(command))
         exit(0)
 
     code = await run_build_command(build_type, workspace_root, unknown_args, package_selection_args,
                                    args.continue_on_failure, args.jobs,
-                                   args.cmake_build_type, args.toggle_graphics)
+                                   args.cmake_build_type, args.toggle_graphics, make_jobs=make_jobs,
+                                   skip_unchanged=skip_unchanged, distribute=args.distribute, events=args.events,
+                                   trace=args.trace)
 
     # Sound Notification
     sound_path = None
@@ -1,4 +1,3 @@
-import argcomplete
 import argparse
 import pathlib
 import shutil
@@ -8,7 +7,7 @@ import click
 from betsy_ros import BuildType, get_workspace_root
 
 from ros_command.completion import LocalPackageCompleter
-from ros_command.util import sizeof_fmt
+from ros_command.util import autocomplete, sizeof_fmt
 
 
 def main():
@@ -21,7 +20,7 @@ def main():
     pack_arg = parser.add_argument('packages', metavar='package', nargs='*')
     pack_arg.completer = LocalPackageCompleter(workspace_root)
 
-    argcomplete.autocomplete(parser)
+    autocomplete(parser)
 
     args = parser.parse_args()
 
@@ -1,12 +1,12 @@
-import argcomplete
 import argparse
 import asyncio
 
 from betsy_ros import get_ros_version, get_workspace_root
 
-from ros_command.command_lib import run, get_overlayed_command
+from ros_command.command_lib import get_overlayed_command, run_passthrough
 from ros_command.completion import PackageCompleter, ExecutableNameCompleter, LaunchFileCompleter
 from ros_command.packages import find_executables_in_package
+from ros_command.util import autocomplete
 
 
 class StartCompleter:
@@ -29,7 +29,7 @@ async def main():
     parser.add_argument('executable_or_launchfile').completer = StartCompleter(workspace_root, version)
     parser.add_argument('argv', nargs=argparse.REMAINDER)
 
-    argcomplete.autocomplete(parser, always_complete_options=False)
+    autocomplete(parser, always_complete_options=False)
     args = parser.parse_args()
 
     if args.executable_or_launchfile in find_executables_in_package(args.package_name, version):
@@ -48,7 +48,7 @@ async def main():
 
     command += args.argv
 
-    code = await run(command)
+    code = await run_passthrough(command, workspace_root=workspace_root)
     exit(code)
 
 
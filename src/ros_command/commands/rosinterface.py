@@ -1,4 +1,3 @@
-import argcomplete
 import argparse
 import asyncio
 import pathlib
@@ -7,10 +6,10 @@ import re
 import click
 
 from betsy_ros import ROSInterface, get_ros_version, get_workspace_root
-from betsy_ros.interfaces import list_interfaces as list_ros_interfaces  # Avoid backwards incompatible name
 
 from ros_command.command_lib import get_output, run
 from ros_command.completion import PackageCompleter, Completer
+from ros_command.util import autocomplete
 
 
 ACTION_PARTS = ['Goal', 'Result', 'Feedback']
@@ -67,6 +66,7 @@ class InterfaceInterface:
 
     def list_interfaces(self, name_filter=None):
         # Implemented with underlying logic to avoid await command
+        from betsy_ros.interfaces import list_interfaces as list_ros_interfaces  # Avoid backwards incompatible name
         interfaces = list(list_ros_interfaces(self.version, [self.interface_type]))
 
         if name_filter is None:
@@ -183,6 +183,20 @@ class InterfaceCompleter(Completer):
     def get_cache_keys(self, **kwargs):
         return [str(self.workspace_root), self.interface_interface.interface_type]
 
+    def get_server_request(self, **kwargs):
+        request = super().get_server_request(**kwargs)
+        request['distro'] = self.interface_interface.distro
+        request['interface_type'] = self.interface_interface.interface_type
+        return request
+
+    @classmethod
+    def from_server_request(cls, request):
+        workspace_root = request['workspace_root']
+        if workspace_root is not None:
+            workspace_root = pathlib.Path(workspace_root)
+        ii = InterfaceInterface(request['version'], request['distro'], request['interface_type'])
+        return cls(workspace_root, ii)
+
     def get_completions(self, **kwargs):
         return [interface.to_string(two_part=self.version == 1)
                 for interface in self.interface_interface.list_interfaces()]
@@ -232,7 +246,7 @@ async def main(interface_type):
     proto_parser.add_argument('interface_name').completer = interface_completer
     subparsers.add_parser('packages')
 
-    argcomplete.autocomplete(parser)
+    autocomplete(parser)
 
     args = parser.parse_args()
     if args.verb == 'info':  # Alias
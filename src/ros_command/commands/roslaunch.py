@@ -1,11 +1,11 @@
-import argcomplete
 import argparse
 import asyncio
 
 from betsy_ros import get_ros_version, get_workspace_root
 
-from ros_command.command_lib import run, get_overlayed_command
+from ros_command.command_lib import get_overlayed_command, run_passthrough
 from ros_command.completion import PackageCompleter, LaunchArgCompleter, LaunchFileCompleter
+from ros_command.util import autocomplete
 
 
 async def main():
@@ -17,7 +17,7 @@ async def main():
     parser.add_argument('launch_file_name').completer = LaunchFileCompleter(workspace_root, version)
     parser.add_argument('argv', nargs=argparse.REMAINDER).completer = LaunchArgCompleter(workspace_root, version)
 
-    argcomplete.autocomplete(parser, always_complete_options=False)
+    autocomplete(parser, always_complete_options=False)
     args = parser.parse_args()
 
     command = []
@@ -30,7 +30,7 @@ async def main():
     command += [args.package_name, args.launch_file_name]
     command += args.argv
 
-    code = await run(command)
+    code = await run_passthrough(command, workspace_root=workspace_root)
     exit(code)
 
 
@@ -1,11 +1,11 @@
-import argcomplete
 import argparse
 import asyncio
 
 from betsy_ros import get_ros_version, get_workspace_root
 
-from ros_command.command_lib import run, get_overlayed_command
+from ros_command.command_lib import get_overlayed_command, run_passthrough
 from ros_command.completion import PackageCompleter, ExecutableNameCompleter
+from ros_command.util import autocomplete
 
 
 async def main(debug=False):
@@ -18,7 +18,7 @@ async def main(debug=False):
     parser.add_argument('executable_name').completer = ExecutableNameCompleter(workspace_root, version)
     parser.add_argument('argv', nargs=argparse.REMAINDER)
 
-    argcomplete.autocomplete(parser, always_complete_options=False)
+    autocomplete(parser, always_complete_options=False)
     args = parser.parse_args()
 
     command = []
@@ -35,7 +35,7 @@ async def main(debug=False):
 
     command += args.argv
 
-    code = await run(command)
+    code = await run_passthrough(command, workspace_root=workspace_root)
     exit(code)
 
 
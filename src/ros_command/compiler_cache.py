@@ -0,0 +1,76 @@
+"""Support for building with ccache or sccache as the compiler launcher."""
+import json
+
+from ros_command.command_lib import get_output
+from ros_command.util import get_config
+
+COMPILER_CACHES = ['ccache', 'sccache']
+DEFAULT_CACHE_FOLDER = '.compiler_cache'
+DEFAULT_CACHE_SIZE = '5G'
+
+# Environment variables for the cache folder and size limit of each tool
+CACHE_ENV_VARS = {
+    'ccache': ('CCACHE_DIR', 'CCACHE_MAXSIZE'),
+    'sccache': ('SCCACHE_DIR', 'SCCACHE_CACHE_SIZE'),
+}
+CCACHE_HIT_KEYS = ['direct_cache_hit', 'preprocessed_cache_hit']
+CCACHE_MISS_KEYS = ['cache_miss']
+
+
+def get_compiler_cache(workspace_root=None):
+    """Return the name of the configured compiler cache, or None."""
+    compiler_cache = get_config('compiler_cache', None, workspace_root)
+    if compiler_cache is None:
+        return
+    if compiler_cache not in COMPILER_CACHES:
+        raise RuntimeError(f'Unknown compiler_cache {compiler_cache}. Options: {", ".join(COMPILER_CACHES)}')
+    return compiler_cache
+
+
+def get_launcher_args(compiler_cache):
+    return [f'-DCMAKE_C_COMPILER_LAUNCHER={compiler_cache}', f'-DCMAKE_CXX_COMPILER_LAUNCHER={compiler_cache}']
+
+
+def get_cache_environment(compiler_cache, workspace_root):
+    """Return the environment variables that give each workspace its own cache folder and size limit."""
+    dir_var, size_var = CACHE_ENV_VARS[compiler_cache]
+    cache_dir = get_config('compiler_cache_dir', None, workspace_root) or workspace_root / DEFAULT_CACHE_FOLDER
+    cache_size = get_config('compiler_cache_size', DEFAULT_CACHE_SIZE, workspace_root)
+    return {dir_var: str(cache_dir), size_var: str(cache_size)}
+
+
+def parse_ccache_stats(s):
+    """Parse the tab-separated output of ccache --print-stats."""
+    counts = {}
+    for line in s.splitlines():
+        key, _, value = line.partition('\t')
+        if value.strip().isdigit():
+            counts[key] = int(value)
+    return sum(counts.get(key, 0) for key in CCACHE_HIT_KEYS), sum(counts.get(key, 0) for key in CCACHE_MISS_KEYS)
+
+
+def parse_sccache_stats(s):
+    """Parse the output of sccache --show-stats --stats-format=json."""
+    stats = json.loads(s)['stats']
+    return sum(stats['cache_hits']['counts'].values()), sum(stats['cache_misses']['counts'].values())
+
+
+async def get_cache_stats(compiler_cache, env):
+    """Return the total number of cache hits and misses so far, or None if they cannot be read."""
+    if compiler_cache == 'ccache':
+        command = ['ccache', '--print-stats']
+        parse = parse_ccache_stats
+    else:
+        command = ['sccache', '--show-stats', '--stats-format=json']
+        parse = parse_sccache_stats
+
+    try:
+        ret, out, _ = await get_output(command, env=env)
+    except OSError:
+        return
+    if ret != 0:
+        return
+    try:
+        return parse(out)
+    except (KeyError, ValueError):
+        return
@@ -1,19 +1,21 @@
 import datetime
+import os
 import pathlib
 import re
-import yaml
+import time
 
-from betsy_ros.environment import get_topics
+from ros_command.completion_server import query_server
 from ros_command.packages import get_all_packages, get_packages_in_folder, get_launch_file_arguments
-from ros_command.packages import find_executables_in_package, find_launch_files_in_package
+from ros_command.packages import find_executables_in_package, find_launch_files_in_package, get_prefix_paths
+from ros_command.packages import get_source_folder
 from ros_command.util import get_config
 
-CACHE_PATH = pathlib.Path('~/.ros/ros_command_cache.yaml').expanduser()
-THE_CACHE = None
-
 # https://stackoverflow.com/a/51916936
 DELTA_PATTERN = re.compile(r'^((?P<hours>[\.\d]+?)h)?((?P<minutes>[\.\d]+?)m)?((?P<seconds>[\.\d]+?)s)?$')
 
+FINGERPRINT_ENV_VARS = ['AMENT_PREFIX_PATH', 'CMAKE_PREFIX_PATH', 'ROS_PACKAGE_PATH']
+AMENT_PACKAGE_INDEX = 'share/ament_index/resource_index/packages'
+
 
 def get_tab_timeout():
     timeout_s = get_config('tab_complete_timeout', '4h')
@@ -24,6 +26,34 @@ def get_tab_timeout():
     return datetime.timedelta(hours=4)
 
 
+def get_path_fingerprint(path):
+    """Return a cheap signature of the path, which changes when entries are added/removed to a directory."""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return [st.st_mtime_ns, st.st_ino, st.st_nlink]
+
+
+def get_subfolders(folder, depth):
+    """Return the folder and all of its subfolders up to the given depth."""
+    folders = [folder]
+    if depth > 0:
+        try:
+            entries = list(os.scandir(folder))
+        except OSError:
+            return folders
+        for entry in entries:
+            if entry.is_dir() and not entry.name.startswith('.'):
+                folders += get_subfolders(entry.path, depth - 1)
+    return folders
+
+
+def get_workspace_fingerprint_paths(workspace_root):
+    """Return the folders where new packages in the workspace would appear."""
+    return get_subfolders(get_source_folder(workspace_root), 2)
+
+
 class Completer:
     def __init__(self, workspace_root=None, version=None):
         self.workspace_root = workspace_root
@@ -39,55 +69,83 @@ class Completer:
         # Overridable method
         return values
 
-    def get_cached_completions(self, cache_keys):
-        global THE_CACHE
+    def get_fingerprint_paths(self, **kwargs):
+        # Overridable method. Returns None if the completions cannot be validated by checking the filesystem.
+        return None
+
+    def get_fingerprint(self, **kwargs):
+        paths = self.get_fingerprint_paths(**kwargs)
+        if paths is None:
+            return
+
+        fingerprint = {var: os.environ.get(var) for var in FINGERPRINT_ENV_VARS}
+        for path in paths:
+            fingerprint[str(path)] = get_path_fingerprint(path)
+        return fingerprint
 
+    def get_cached_completions(self, cache_keys, fingerprint=None):
         if cache_keys is None:
             return
 
-        # Load cache
-        if THE_CACHE is None:
-            if CACHE_PATH.exists():
-                THE_CACHE = yaml.safe_load(open(CACHE_PATH))
-            else:
-                THE_CACHE = {}
-
-        # Get relevant part
-        d = THE_CACHE
-        for key in cache_keys:
-            if key not in d:
-                d[key] = {}
-            d = d[key]
-
-        # Check timing
-        if 'stamp' not in d:
+        from ros_command.cache import get_cache
+        entry = get_cache().get(cache_keys)
+        if entry is None:
             return
-        delta = datetime.datetime.now() - d['stamp']
-        if delta < get_tab_timeout():
-            return d['data']
 
-    def write_to_cache(self, cache_keys, results):
-        if cache_keys is None:
+        stamp, cached_fingerprint, data = entry
+
+        # Check the filesystem, if possible
+        if fingerprint is not None:
+            if fingerprint == cached_fingerprint:
+                return data
             return
 
-        d = THE_CACHE
-        for key in cache_keys:
-            d = d[key]
+        # Otherwise, check timing
+        if time.time() - stamp < get_tab_timeout().total_seconds():
+            return data
 
-        d['data'] = list(results)
-        d['stamp'] = datetime.datetime.now()
-        yaml.safe_dump(THE_CACHE, open(CACHE_PATH, 'w'))
+    def write_to_cache(self, cache_keys, results, fingerprint=None):
+        if cache_keys is None:
+            return
 
-    def __call__(self, **kwargs):
+        from ros_command.cache import get_cache
+        get_cache().set(cache_keys, list(results), fingerprint=fingerprint)
+
+    def get_server_request(self, prefix=None, parsed_args=None, **kwargs):
+        return {
+            'module': type(self).__module__,
+            'class': type(self).__name__,
+            'workspace_root': self.workspace_root,
+            'version': self.version,
+            'kwargs': {'prefix': prefix, 'parsed_args': vars(parsed_args) if parsed_args else {}},
+        }
+
+    @classmethod
+    def from_server_request(cls, request):
+        workspace_root = request['workspace_root']
+        if workspace_root is not None:
+            workspace_root = pathlib.Path(workspace_root)
+        return cls(workspace_root, request['version'])
+
+    def complete(self, **kwargs):
+        """Compute the completions in this process."""
         cache_keys = self.get_cache_keys(**kwargs)
+        fingerprint = self.get_fingerprint(**kwargs) if cache_keys is not None else None
 
-        results = self.get_cached_completions(cache_keys)
+        results = self.get_cached_completions(cache_keys, fingerprint)
         if not results:
             results = self.get_completions(**kwargs)
-            self.write_to_cache(cache_keys, results)
+            self.write_to_cache(cache_keys, results, fingerprint)
 
         return self.filter_values(results, **kwargs)
 
+    def __call__(self, **kwargs):
+        # Use the completion server if it is running
+        results = query_server(self.get_server_request(**kwargs))
+        if results is None:
+            results = self.complete(**kwargs)
+        return results
+
 
 class PackageCompleter(Completer):
     def get_cache_keys(self, **kwargs):
@@ -96,6 +154,15 @@ class PackageCompleter(Completer):
     def get_completions(self, **kwargs):
         return get_all_packages(self.workspace_root)
 
+    def get_fingerprint_paths(self, **kwargs):
+        if 'AMENT_PREFIX_PATH' not in os.environ:
+            # Cannot cheaply check the ROS_PACKAGE_PATH for new packages
+            return
+        paths = [os.path.join(prefix, AMENT_PACKAGE_INDEX) for prefix in get_prefix_paths(2)]
+        if self.workspace_root:
+            paths += get_workspace_fingerprint_paths(self.workspace_root)
+        return paths
+
 
 class LocalPackageCompleter(Completer):
     def get_cache_keys(self, **kwargs):
@@ -104,6 +171,10 @@ class LocalPackageCompleter(Completer):
     def get_completions(self, **kwargs):
         return get_packages_in_folder(self.workspace_root)
 
+    def get_fingerprint_paths(self, **kwargs):
+        if self.workspace_root:
+            return get_workspace_fingerprint_paths(self.workspace_root)
+
 
 class ExecutableNameCompleter(Completer):
     def get_cache_keys(self, parsed_args, **kwargs):
@@ -112,6 +183,9 @@ class ExecutableNameCompleter(Completer):
     def get_completions(self, parsed_args, **kwargs):
         return find_executables_in_package(parsed_args.package_name, self.version)
 
+    def get_fingerprint_paths(self, parsed_args, **kwargs):
+        return [os.path.join(prefix, 'lib', parsed_args.package_name) for prefix in get_prefix_paths(self.version)]
+
 
 class LaunchFileCompleter(Completer):
     def get_cache_keys(self, parsed_args, **kwargs):
@@ -120,6 +194,16 @@ class LaunchFileCompleter(Completer):
     def get_completions(self, parsed_args, **kwargs):
         return find_launch_files_in_package(parsed_args.package_name, self.version)
 
+    def get_fingerprint_paths(self, parsed_args, **kwargs):
+        if self.version == 1:
+            # ROS 1 launch files are found in the source folders
+            return
+        paths = []
+        for prefix in get_prefix_paths(self.version):
+            share_folder = os.path.join(prefix, 'share', parsed_args.package_name)
+            paths += [share_folder, os.path.join(share_folder, 'launch')]
+        return paths
+
 
 class LaunchArgCompleter(Completer):
     def get_cache_keys(self, parsed_args, **kwargs):
@@ -131,6 +215,16 @@ class LaunchArgCompleter(Completer):
                                          self.version)
         return [f'{a}:=' for a in args]
 
+    def get_fingerprint_paths(self, parsed_args, **kwargs):
+        if self.version == 1:
+            return
+        for prefix in get_prefix_paths(self.version):
+            share_folder = os.path.join(prefix, 'share', parsed_args.package_name)
+            for folder in [os.path.join(share_folder, 'launch'), share_folder]:
+                path = os.path.join(folder, parsed_args.launch_file_name)
+                if os.path.exists(path):
+                    return [folder, path]
+
     def filter_values(self, values, parsed_args, **kwargs):
         existing_args = set()
         for arg_s in parsed_args.argv:
@@ -145,6 +239,8 @@ class TopicCompleter(Completer):
         return [str(self.version), 'topics']
 
     def get_completions(self, prefix, parsed_args, **kwargs):
+        from betsy_ros.environment import get_topics
+
         matches = []
         for topic in get_topics(self.version):
             if topic.startswith(prefix):
@@ -0,0 +1,99 @@
+"""Optional background process that answers tab completion requests from memory.
+
+Each tab completion otherwise requires starting a fresh Python process and importing the ROS libraries.
+When the server is running, the Completer objects send their requests over a unix socket instead.
+"""
+import json
+import os
+import pathlib
+import socket
+
+SOCKET_PATH = pathlib.Path('~/.ros/ros_command_completion.sock').expanduser()
+CLIENT_TIMEOUT = 1.0
+
+# Environment variables that determine the completions, which are forwarded from the client's shell
+FORWARDED_ENV_VARS = ['AMENT_PREFIX_PATH', 'CMAKE_PREFIX_PATH', 'ROS_PACKAGE_PATH', 'ROS_VERSION', 'ROS_DISTRO',
+                      'ROS_DOMAIN_ID', 'ROS_MASTER_URI']
+
+
+def query_server(request):
+    """Send the request to the completion server and return the list of completions.
+
+    Returns None if the server is not running or does not respond in time.
+    """
+    if not SOCKET_PATH.exists():
+        return
+
+    request['env'] = {var: os.environ.get(var) for var in FORWARDED_ENV_VARS}
+
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.settimeout(CLIENT_TIMEOUT)
+            sock.connect(str(SOCKET_PATH))
+            sock.sendall(json.dumps(request, default=str).encode('UTF8') + b'\n')
+            response = b''
+            while not response.endswith(b'\n'):
+                chunk = sock.recv(65536)
+                if not chunk:
+                    break
+                response += chunk
+        reply = json.loads(response)
+    except (OSError, ValueError):
+        return
+
+    return reply.get('completions')
+
+
+def handle_request(request):
+    import argparse
+    import importlib
+
+    from ros_command.completion import Completer
+
+    module_name = request['module']
+    if module_name.split('.')[0] != 'ros_command':
+        raise RuntimeError(f'Refusing to load completer from {module_name}')
+    cls = getattr(importlib.import_module(module_name), request['class'])
+    if not issubclass(cls, Completer):
+        raise RuntimeError(f'{cls} is not a Completer')
+
+    for var, value in request['env'].items():
+        if value is None:
+            os.environ.pop(var, None)
+        else:
+            os.environ[var] = value
+
+    completer = cls.from_server_request(request)
+    kwargs = dict(request['kwargs'])
+    kwargs['parsed_args'] = argparse.Namespace(**kwargs['parsed_args'])
+    return list(completer.complete(**kwargs))
+
+
+def main():
+    import socketserver
+
+    class CompletionHandler(socketserver.StreamRequestHandler):
+        def handle(self):
+            try:
+                request = json.loads(self.rfile.readline())
+                reply = {'completions': handle_request(request)}
+            except Exception as e:
+                reply = {'error': str(e)}
+            self.wfile.write(json.dumps(reply).encode('UTF8') + b'\n')
+
+    SOCKET_PATH.parent.mkdir(parents=True, exist_ok=True)
+    if SOCKET_PATH.exists():
+        SOCKET_PATH.unlink()
+
+    old_umask = os.umask(0o077)
+    server = socketserver.UnixStreamServer(str(SOCKET_PATH), CompletionHandler)
+    os.umask(old_umask)
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if SOCKET_PATH.exists():
+            SOCKET_PATH.unlink()
@@ -0,0 +1,90 @@
+"""Split a colcon build between several worker processes.
+
+The dependency graph is divided into waves of packages whose dependencies were all built in earlier waves.
+The packages in each wave are spread between the workers, each of which runs its own colcon build
+(with its own log folder) against the shared build and install folders.
+"""
+import asyncio
+import statistics
+
+from ros_command.build_tool import STATUS_MARKERS, STATUS_PATTERN
+from ros_command.command_lib import _default_stderr_callback, _default_stdout_callback, run
+
+
+def get_waves(upstream):
+    """Return a list of sets of packages that can be built once all the previous sets are built."""
+    remaining = {pkg: {dep for dep in deps if dep in upstream} for pkg, deps in upstream.items()}
+    waves = []
+    while remaining:
+        wave = {pkg for pkg, deps in remaining.items() if not deps}
+        if not wave:
+            raise RuntimeError(f'Circular dependency between {", ".join(sorted(remaining))}')
+        waves.append(wave)
+        for pkg in wave:
+            del remaining[pkg]
+        for deps in remaining.values():
+            deps -= wave
+    return waves
+
+
+def assign_packages(packages, workers, expected_durations={}):
+    """Divide the packages between the workers, giving the longest remaining package to the least loaded worker."""
+    default_duration = statistics.median(expected_durations.values()) if expected_durations else 1.0
+    durations = {pkg: expected_durations.get(pkg, default_duration) for pkg in packages}
+    assignments = [[] for _ in range(workers)]
+    loads = [0.0] * workers
+    for pkg in sorted(packages, key=lambda pkg: (-durations[pkg], pkg)):
+        i = loads.index(min(loads))
+        assignments[i].append(pkg)
+        loads[i] += durations[pkg]
+    return assignments
+
+
+def get_worker_command(command, worker_index):
+    """Give each worker its own log folder, since colcon does not support concurrent builds sharing one."""
+    return command[:1] + ['--log-base', f'log/worker_{worker_index}'] + command[1:]
+
+
+def get_result_callback(batch_callback, results):
+    """Wrap the batch callback to also record the result of each package from the colcon status lines."""
+    def result_callback(lines):
+        for line in lines:
+            if STATUS_MARKERS[1] in line:
+                m = STATUS_PATTERN.search(line)
+                if m and m.group('end_pkg'):
+                    results[m.group('end_pkg')] = m.group('end_verb')
+        batch_callback(lines)
+    return result_callback
+
+
+async def run_distributed(upstream, workers, generate_command, cwd=None, env=None, stdout_batch_callback=None,
+                          stderr_batch_callback=None, continue_on_failure=False, expected_durations={}):
+    """Build the packages in upstream with the given number of worker processes and return the return code.
+
+    generate_command is called with the package selection args for each worker's colcon build.
+    """
+    code = 0
+    # The last status of each package (i.e. Finished or Failed)
+    results = {}
+    stdout_batch_callback = get_result_callback(stdout_batch_callback or _default_stdout_callback, results)
+    stderr_batch_callback = get_result_callback(stderr_batch_callback or _default_stderr_callback, results)
+    # Packages that did not finish, which everything downstream of them depends on
+    failed = set()
+    for wave in get_waves(upstream):
+        blocked = {pkg for pkg in wave if upstream[pkg] & failed}
+        failed |= blocked
+        assignments = [pkgs for pkgs in assign_packages(wave - blocked, workers, expected_durations) if pkgs]
+
+        commands = [get_worker_command(generate_command(['--packages-select'] + pkgs), i)
+                    for i, pkgs in enumerate(assignments)]
+        codes = await asyncio.gather(*[run(command, cwd=cwd, env=env, stdout_batch_callback=stdout_batch_callback,
+                                           stderr_batch_callback=stderr_batch_callback)
+                                       for command in commands])
+
+        for pkgs, worker_code in zip(assignments, codes):
+            if worker_code != 0:
+                code = worker_code
+                failed.update(pkg for pkg in pkgs if results.get(pkg) != 'Finished')
+        if code != 0 and not continue_on_failure:
+            break
+    return code
@@ -0,0 +1,101 @@
+"""Compressed storage of the error output of each build, grouped by package.
+
+The lines of each package are compressed in blocks and appended to one file per build.
+An index of the offset and length of each package's blocks allows reading a single package's output.
+"""
+import collections
+import datetime
+import json
+import shutil
+import zlib
+
+LOG_FILENAME = 'errors.z'
+INDEX_FILENAME = 'errors.index.json'
+BLOCK_SIZE = 1 << 16
+KEEP_BUILDS = 10
+# Key for output that cannot be attributed to a package
+OTHER_KEY = ''
+
+
+def get_log_base(workspace_root):
+    return workspace_root / 'log' / 'rosbuild'
+
+
+def get_log_folders(workspace_root, complete_only=True):
+    """Return the log folders of the previous builds, oldest first.
+
+    Incomplete folders (without an index) are from builds that are still running or crashed.
+    """
+    log_base = get_log_base(workspace_root)
+    if not log_base.exists():
+        return []
+    return sorted(folder for folder in log_base.iterdir()
+                  if folder.is_dir() and (not complete_only or (folder / INDEX_FILENAME).exists()))
+
+
+class ErrorLog:
+    def __init__(self, workspace_root):
+        for folder in get_log_folders(workspace_root, complete_only=False)[:-KEEP_BUILDS + 1]:
+            shutil.rmtree(folder, ignore_errors=True)
+
+        stamp_s = datetime.datetime.now().strftime('%Y-%m-%d_%H-%M-%S-%f')
+        self.folder = get_log_base(workspace_root) / stamp_s
+        self.folder.mkdir(parents=True, exist_ok=True)
+        self.file = open(self.folder / LOG_FILENAME, 'wb')
+        self.index = collections.defaultdict(list)
+        self.blocks = collections.defaultdict(list)
+        self.block_sizes = collections.defaultdict(int)
+
+    def add_line(self, pkg, line):
+        key = pkg or OTHER_KEY
+        self.blocks[key].append(line)
+        self.block_sizes[key] += len(line) + 1
+        if self.block_sizes[key] >= BLOCK_SIZE:
+            self.write_block(key)
+
+    def write_block(self, key):
+        data = zlib.compress(''.join(line + '\n' for line in self.blocks[key]).encode('UTF8', 'replace'))
+        self.index[key].append([self.file.tell(), len(data)])
+        self.file.write(data)
+        del self.blocks[key]
+        del self.block_sizes[key]
+
+    def close(self):
+        for key in list(self.blocks):
+            self.write_block(key)
+        self.file.close()
+        with open(self.folder / INDEX_FILENAME, 'w') as f:
+            json.dump(self.index, f)
+
+
+def read_error_log(folder, pkg=None):
+    """Yield the stored lines (with newlines) for the package, or for all packages with a header for each."""
+    with open(folder / INDEX_FILENAME) as f:
+        index = json.load(f)
+
+    if pkg is not None:
+        keys = [pkg] if pkg in index else []
+    else:
+        keys = list(index)
+
+    with open(folder / LOG_FILENAME, 'rb') as f:
+        for key in keys:
+            if pkg is None:
+                yield f'=== {key or "(no package)"} ===\n'
+            for offset, length in index[key]:
+                f.seek(offset)
+                yield zlib.decompress(f.read(length)).decode('UTF8')
+
+
+def show_last_errors(workspace_root, pkg=None):
+    import click
+
+    folders = get_log_folders(workspace_root)
+    if not folders:
+        click.secho(f'No build logs in {get_log_base(workspace_root)}', fg='yellow')
+        return
+    with open(folders[-1] / INDEX_FILENAME) as f:
+        if pkg and pkg not in json.load(f):
+            click.secho(f'No errors recorded for {pkg} in the last build', fg='yellow')
+            return
+    click.echo_via_pager(read_error_log(folders[-1], pkg))
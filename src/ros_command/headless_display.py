@@ -0,0 +1,45 @@
+"""Build progress for non-interactive output (i.e. CI logs), without redrawing a terminal interface."""
+import asyncio
+import time
+
+from ros_command.build_tool import STATUS_COLORS
+from ros_command.util import format_duration, get_config
+
+DEFAULT_SUMMARY_PERIOD = 60.0
+# Transitions worth a line in the log
+REPORTED_STATES = ['active', 'finished', 'failed', 'skipped']
+
+
+class HeadlessStatusDisplay:
+    """Print one line for each package that starts or stops, and a compact summary every summary_period seconds."""
+
+    def __init__(self, status, summary_period=None):
+        self.status = status
+        if summary_period is None:
+            summary_period = get_config('headless_summary_period', DEFAULT_SUMMARY_PERIOD)
+        self.summary_period = summary_period
+        self.loop = asyncio.get_event_loop()
+        self.summary_handle = self.loop.call_later(self.summary_period, self.summarize)
+        self.status.add_listener(self.on_change)
+
+    def on_change(self, pkg=None, old_state=None, new_state=None):
+        if new_state not in REPORTED_STATES:
+            return
+        import click
+
+        elapsed_s = format_duration(time.time() - self.status.start_time)
+        s = f'[{elapsed_s:>9}] {new_state:<8} {pkg}'
+        if pkg in self.status.durations and new_state == 'finished':
+            s += f' ({format_duration(self.status.durations[pkg])})'
+        summary = self.status.get_diagnostic_summary(pkg)
+        if summary:
+            s += f' {summary}'
+        click.secho(s, fg=STATUS_COLORS.get(new_state))
+
+    def summarize(self):
+        self.status.print_status(compact=True)
+        self.summary_handle = self.loop.call_later(self.summary_period, self.summarize)
+
+    def finish(self):
+        self.summary_handle.cancel()
+        self.status.listeners.remove(self.on_change)
@@ -0,0 +1,116 @@
+"""Detect the packages that do not need to be rebuilt.
+
+The signature of each package is a hash of its source files, the signatures of the workspace packages it depends on,
+the build arguments and the environment variables that determine the underlay being built against.
+Packages whose signature matches the one from their last successful build can be skipped.
+"""
+import hashlib
+import json
+import os
+
+# Folders within packages that do not affect the build
+IGNORED_FOLDERS = {'__pycache__'}
+# Environment variables that change what the packages are built against (i.e. after sourcing a different underlay)
+SIGNATURE_ENVIRONMENT_VARIABLES = ['AMENT_PREFIX_PATH', 'CMAKE_PREFIX_PATH', 'ROS_DISTRO', 'ROS_VERSION']
+
+
+def hash_file(path):
+    h = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def get_source_digest(path, file_hashes):
+    """Return a hash of all the files in the folder.
+
+    file_hashes maps relative paths to [mtime_ns, size, content_hash] and is updated in place.
+    Files are only read when their modification time or size changed, so touching a file without
+    changing it does not change the digest.
+    """
+    h = hashlib.sha1()
+    seen = set()
+    for folder, subfolders, filenames in os.walk(path):
+        subfolders[:] = sorted(name for name in subfolders if name[0] != '.' and name not in IGNORED_FOLDERS)
+        for filename in sorted(filenames):
+            full_path = os.path.join(folder, filename)
+            rel_path = os.path.relpath(full_path, path)
+            try:
+                st = os.stat(full_path)
+            except OSError:
+                # i.e. broken symlinks
+                continue
+            entry = file_hashes.get(rel_path)
+            if entry is None or entry[0] != st.st_mtime_ns or entry[1] != st.st_size:
+                entry = [st.st_mtime_ns, st.st_size, hash_file(full_path)]
+                file_hashes[rel_path] = entry
+            seen.add(rel_path)
+            h.update(f'{rel_path} {entry[2]}\n'.encode('UTF8'))
+
+    for rel_path in set(file_hashes) - seen:
+        del file_hashes[rel_path]
+    return h.hexdigest()
+
+
+def get_package_signatures(workspace_root, packages, build_args):
+    """Return the signature of each of the packages and all their upstream dependencies in the workspace."""
+    from ros_command.build_tool import get_workspace_packages
+    from ros_command.cache import get_cache
+
+    cache = get_cache()
+    workspace_packages = get_workspace_packages(workspace_root)
+    args_s = json.dumps([build_args] + [os.environ.get(name) for name in SIGNATURE_ENVIRONMENT_VARIABLES])
+    signatures = {}
+
+    def get_signature(pkg):
+        if pkg not in signatures:
+            info = workspace_packages[pkg]
+            cache_keys = [str(workspace_root), 'file_hashes', pkg]
+            entry = cache.get(cache_keys)
+            file_hashes = entry[2] if entry else {}
+            digest = get_source_digest(info.path, file_hashes)
+            cache.set(cache_keys, file_hashes, commit=False)
+
+            h = hashlib.sha1()
+            h.update(f'{digest}\n{args_s}\n'.encode('UTF8'))
+            for dep in sorted(info.deps):
+                h.update(f'{dep} {get_signature(dep)}\n'.encode('UTF8'))
+            signatures[pkg] = h.hexdigest()
+        return signatures[pkg]
+
+    for pkg in packages:
+        if pkg in workspace_packages:
+            get_signature(pkg)
+    cache.commit()
+    return signatures
+
+
+def load_signatures(workspace_root):
+    """Return the signature of each package at its last successful build."""
+    from ros_command.cache import get_cache
+
+    entry = get_cache().get([str(workspace_root), 'package_signatures'])
+    if entry is None:
+        return {}
+    return entry[2]
+
+
+def save_signatures(workspace_root, signatures):
+    from ros_command.cache import get_cache
+
+    saved = load_signatures(workspace_root)
+    saved.update(signatures)
+    get_cache().set([str(workspace_root), 'package_signatures'], saved)
+
+
+def is_installed(workspace_root, pkg):
+    """Check for the package in either an isolated or a merged install folder."""
+    install_folder = workspace_root / 'install'
+    return (install_folder / pkg).exists() or (install_folder / 'share' / pkg).exists()
+
+
+def get_unchanged_packages(workspace_root, signatures):
+    saved = load_signatures(workspace_root)
+    return {pkg for pkg, signature in signatures.items()
+            if saved.get(pkg) == signature and is_installed(workspace_root, pkg)}
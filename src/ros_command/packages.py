@@ -1,9 +1,9 @@
+import hashlib
 import os
 
-from rosdep2.ament_packages import get_packages_with_prefixes, AMENT_PREFIX_PATH_ENV_VAR
-from rosdep2.catkin_packages import find_catkin_packages_in
-
+AMENT_PREFIX_PATH_ENV_VAR = 'AMENT_PREFIX_PATH'
 ROS_PACKAGE_PATH = 'ROS_PACKAGE_PATH'
+CMAKE_PREFIX_PATH = 'CMAKE_PREFIX_PATH'
 
 
 def get_packages_in_folder(folder, verbose=False):
@@ -14,9 +14,29 @@ def get_packages_in_folder(folder, verbose=False):
 
     https://github.com/ros-infrastructure/rosdep/blob/master/src/rosdep2/catkin_packages.py#L19
     """
+    from rosdep2.catkin_packages import find_catkin_packages_in
     return set(find_catkin_packages_in(folder, verbose=verbose))
 
 
+def get_source_folder(workspace_root):
+    """Return the folder containing the workspace's source code."""
+    src_folder = workspace_root / 'src'
+    if src_folder.exists():
+        return src_folder
+    return workspace_root
+
+
+def get_manifest_fingerprint(folder):
+    """Return a hash of the locations and modification times of all the package.xml files in the folder."""
+    from catkin_pkg.packages import find_package_paths
+
+    h = hashlib.sha1()
+    for path in sorted(find_package_paths(str(folder))):
+        st = os.stat(os.path.join(folder, path, 'package.xml'))
+        h.update(f'{path} {st.st_mtime_ns} {st.st_size}\n'.encode('UTF8'))
+    return h.hexdigest()
+
+
 def get_all_packages(folder=None, verbose=False):
     """Return the set of all packages in the environment."""
     universe = set()
@@ -25,8 +45,10 @@ def get_all_packages(folder=None, verbose=False):
 
     # Get Packages From Path
     if AMENT_PREFIX_PATH_ENV_VAR in os.environ:
+        from rosdep2.ament_packages import get_packages_with_prefixes
         universe.update(get_packages_with_prefixes().keys())
     elif ROS_PACKAGE_PATH in os.environ:
+        from rosdep2.catkin_packages import find_catkin_packages_in
         for path in os.environ[ROS_PACKAGE_PATH].split(os.pathsep):
             if not os.path.exists(path):
                 continue
@@ -34,6 +56,12 @@ def get_all_packages(folder=None, verbose=False):
     return universe
 
 
+def get_prefix_paths(version):
+    """Return the list of install prefixes that packages are found in."""
+    env_var = AMENT_PREFIX_PATH_ENV_VAR if version == 2 else CMAKE_PREFIX_PATH
+    return [path for path in os.environ.get(env_var, '').split(os.pathsep) if path]
+
+
 def find_executables_in_package(package_name, version):
     if version == 1:
         from catkin.find_in_workspaces import find_in_workspaces
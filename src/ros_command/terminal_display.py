@@ -1,5 +1,7 @@
+import itertools
 from math import ceil
 import random
+import sys
 
 from blessed import Terminal
 from blessed.formatters import COLORS, resolve_color
@@ -18,36 +20,212 @@ LETTER_OFFSETS = [0x00061, 0x1D41A, 0x1D44E, 0x1D482, 0x1D5BA, 0x1D5EE, 0x1D622,
                   0x1D468, 0x1D5A0, 0x1D5D4, 0x1D608, 0x1D63C, 0x1D4D0, 0x1D56C, 0x1D670]
 SPINNER = '🕐🕑🕒🕓🕔🕕🕖🕗🕘🕙🕚🕛'
 
+# Kinds of tokens in the strings passed to the display
+ATTRIBUTE, NEWLINE, TEXT, WIDE_TEXT = range(4)
+PARSE_CACHE_SIZE = 4096
+
 
 class TerminalDisplay:
-    """Wrapper around blessed.Terminal that allows for easy xy printing."""
+    """Wrapper around blessed.Terminal that allows for easy xy printing.
+
+    While drawing, the text is composed into a frame buffer of (attribute, character) cells.
+    At the end of each frame, only the cells that changed since the previous frame are written to the terminal.
+    """
 
     def __init__(self):
         self.term = Terminal()
-        print(self.home + self.clear)
+        sys.stdout.write(self.home + self.clear)
         self.saved_size = None
         self.root = None
 
+        self.frame = None
+        self.previous_frame = None
+        self.cursor = (0, 0)
+        self.attribute = ''
+        self.normal_sequences = set(self.term.split_seqs(self.term.normal))
+        self.char_widths = {}
+        # The same strings are drawn in most frames, so their parsed tokens are reused
+        self.parse_cache = {}
+        self.cell_cache = {}
+        self.moves = {}
+
     def __call__(self, s, xy=None):
         """Mild hack to use the display object as a functor to call display('text', (5, 5))."""
+        if self.frame is None:
+            if xy:
+                print(self.term.move_xy(*xy), end='')
+            print(s, end='')
+            return
+
         if xy:
-            print(self.term.move_xy(*xy), end='')
-        print(s, end='')
+            self.cursor = xy
+        x, y = self.cursor
+        for kind, value in self.parse(s):
+            if kind == TEXT:
+                x = self.write_text(x, y, value)
+            elif kind == ATTRIBUTE:
+                self.attribute = value
+            elif kind == NEWLINE:
+                x, y = 0, y + 1
+            else:
+                for c in value:
+                    x += self.set_cell(x, y, c)
+        self.cursor = x, y
+
+    def parse(self, s):
+        """Split the string into a list of (kind, value) tokens.
+
+        Only the most recent attribute is kept, which is all the components use.
+        Text where every character is one cell wide is kept together so that it can be written as a slice.
+        """
+        tokens = self.parse_cache.get(s)
+        if tokens is not None:
+            return tokens
+
+        tokens = []
+        chars = []
+
+        def add_text():
+            if chars:
+                text = ''.join(chars)
+                simple = all(self.get_char_width(c) == 1 for c in chars)
+                tokens.append((TEXT if simple else WIDE_TEXT, text))
+                chars.clear()
+
+        # Splitting the escape sequences is slow, so only do it when needed
+        for element in self.term.split_seqs(s) if '\x1b' in s else s:
+            if element[0] == '\x1b':
+                add_text()
+                tokens.append((ATTRIBUTE, '' if element in self.normal_sequences else element))
+            elif element == '\n':
+                add_text()
+                tokens.append((NEWLINE, None))
+            else:
+                chars.append(element)
+        add_text()
+
+        if len(self.parse_cache) >= PARSE_CACHE_SIZE:
+            self.parse_cache.clear()
+        self.parse_cache[s] = tokens
+        return tokens
+
+    def write_text(self, x, y, text):
+        """Write a string of single-width characters to the frame and return the next x."""
+        end_x = x + len(text)
+        if y < 0 or y >= len(self.frame):
+            return end_x
+        row = self.frame[y]
+        x0 = max(x, 0)
+        x1 = min(end_x, len(row))
+        if x0 >= x1:
+            return end_x
+
+        # Replace wide characters that are partially overwritten
+        if row[x0][1] == '' and x0 > 0:
+            row[x0 - 1] = row[x0 - 1][0], ' '
+        if x1 < len(row) and row[x1][1] == '':
+            row[x1] = row[x1][0], ' '
+
+        key = self.attribute, text
+        cells = self.cell_cache.get(key)
+        if cells is None:
+            if len(self.cell_cache) >= PARSE_CACHE_SIZE:
+                self.cell_cache.clear()
+            cells = self.cell_cache[key] = [(self.attribute, c) for c in text]
+        row[x0:x1] = cells[x0 - x:x1 - x]
+        return end_x
+
+    def move_xy(self, x, y):
+        move = self.moves.get((x, y))
+        if move is None:
+            move = self.moves[x, y] = self.term.move_xy(x, y)
+        return move
 
     def __getattr__(self, k):
         """Get colors and other properties from the terminal object."""
         return self.term.__getattr__(k)
 
+    def get_char_width(self, c):
+        if c not in self.char_widths:
+            self.char_widths[c] = max(self.term.length(c), 0)
+        return self.char_widths[c]
+
+    def set_cell(self, x, y, c):
+        """Write one character to the frame and return its width. Wide characters are followed by empty cells."""
+        width = self.get_char_width(c)
+        if y < 0 or y >= len(self.frame) or x < 0:
+            return width
+        row = self.frame[y]
+        if width == 0:
+            # Combining character
+            if 0 < x <= len(row):
+                attribute, previous_c = row[x - 1]
+                row[x - 1] = attribute, previous_c + c
+            return width
+        if x + width > len(row):
+            return width
+
+        # Replace wide characters that are partially overwritten
+        if row[x][1] == '' and x > 0:
+            row[x - 1] = row[x - 1][0], ' '
+        if x + width < len(row) and row[x + width][1] == '':
+            row[x + width] = row[x + width][0], ' '
+
+        row[x] = self.attribute, c
+        for dx in range(1, width):
+            row[x + dx] = self.attribute, ''
+        return width
+
+    def start_frame(self, size):
+        w, h = size
+        self.frame = [[('', ' ')] * w for _ in range(h)]
+        self.cursor = (0, 0)
+        self.attribute = ''
+
+    def write_frame(self):
+        """Write the cells that differ from the previous frame in a single write."""
+        out = []
+        if self.previous_frame is None or len(self.previous_frame) != len(self.frame):
+            out.append(self.term.normal + self.clear)
+            previous_frame = [[]] * len(self.frame)
+        else:
+            previous_frame = self.previous_frame
+
+        attribute = None
+        cursor = None
+        for y, (row, previous_row) in enumerate(zip(self.frame, previous_frame)):
+            if row == previous_row:
+                continue
+            same_width = len(row) == len(previous_row)
+            for x, cell in enumerate(row):
+                if cell[1] == '' or (same_width and previous_row[x] == cell):
+                    continue
+                if cursor != (x, y):
+                    out.append(self.move_xy(x, y))
+                if cell[0] != attribute:
+                    out.append(self.term.normal + cell[0])
+                    attribute = cell[0]
+                out.append(cell[1])
+                # The terminal may not agree on the width of wide characters, so move explicitly after them
+                cursor = (x + 1, y) if self.get_char_width(cell[1][0]) == 1 else None
+
+        out.append(self.term.normal + self.move_xy(0, len(self.frame)))
+        sys.stdout.write(''.join(out))
+        sys.stdout.flush()
+        self.previous_frame = self.frame
+        self.frame = None
+
     def draw(self):
         """Draw all the elements."""
         if self.root:
             size = (self.term.width, self.term.height - 1)
             if not self.saved_size or self.saved_size != size:
-                print(self.clear)
                 self.root.set_geometry((0, 0), size)
                 self.saved_size = size
+                self.previous_frame = None
+            self.start_frame(size)
             self.root.draw(self)
-        print(self.term.normal)
+            self.write_frame()
 
     def get_colors(self, pattern):
         """Get all the colors where the color name matches a given pattern."""
@@ -59,7 +237,6 @@ class TerminalDisplay:
     def finish(self):
         if self.root:
             self.root.finish()
-        self.term.move_xy(0, self.term.height)
 
 
 class DynamicLayoutTerminalDisplay(TerminalDisplay):
@@ -71,20 +248,19 @@ class DynamicLayoutTerminalDisplay(TerminalDisplay):
 
     def draw(self):
         size = (self.term.width, self.term.height - 1)
-        if self.root and self.saved_size and self.saved_size == size:
-            self.root.draw(self)
-            print(self.term.normal)
-            return
+        if not self.root or not self.saved_size or self.saved_size != size:
+            # Dynanmic Layout
+            if size[1] < self.cutoff:
+                self.root = self.small_layout
+            else:
+                self.root = self.large_layout
+            self.root.set_geometry((0, 0), size)
+            self.saved_size = size
+            self.previous_frame = None
 
-        # Dynanmic Layout
-        print(self.clear)
-        if size[1] < self.cutoff:
-            self.root = self.small_layout
-        else:
-            self.root = self.large_layout
-        self.root.set_geometry((0, 0), size)
+        self.start_frame(size)
         self.root.draw(self)
-        self.saved_size = size
+        self.write_frame()
 
 
 class TerminalComponent:
@@ -171,7 +347,7 @@ class Log(Box):
         max_lines = self.h - 2
         self.lines = []
         # Only save useful number of lines
-        for line in lines[-max_lines:]:
+        for line in reversed(list(itertools.islice(reversed(lines), max_lines))):
             # Replace tabs with spaces for proper length computations
             fixed_line = line.replace('\t', '    ')
             self.lines.append(fixed_line)
@@ -207,7 +383,7 @@ class Gauge(Box):
             ys = range(1, self.h - 1)
             x1 = self.x0 + 1
         elif self.title:
-            print(self.border_color)
+            display(self.border_color)
             if self.h >= 1:
                 w = self.w - len(self.title)
                 x1 = self.x0 + len(self.title)
@@ -216,7 +392,7 @@ class Gauge(Box):
                 x1 = self.x0
             ys = range(self.h)
         else:
-            print(self.border_color)
+            display(self.border_color)
             w = self.w
             ys = range(self.h)
             x1 = self.x0
@@ -1,7 +1,6 @@
+import os
 import pathlib
 
-import yaml
-
 CONFIG_PATH = pathlib.Path('~/.ros/ros_command.yaml').expanduser()
 CONFIG = None
 
@@ -10,6 +9,7 @@ def get_config(key, default_value=None, workspace_root=None):
     if workspace_root:
         local_config_path = workspace_root / 'ros_command.yaml'
         if local_config_path.exists():
+            import yaml
             local_config = yaml.safe_load(open(local_config_path))
             if key in local_config:
                 return local_config[key]
@@ -17,6 +17,7 @@ def get_config(key, default_value=None, workspace_root=None):
     global CONFIG
     if CONFIG is None:
         if CONFIG_PATH.exists():
+            import yaml
             CONFIG = yaml.safe_load(open(CONFIG_PATH))
         else:
             CONFIG = {}
@@ -24,6 +25,30 @@ def get_config(key, default_value=None, workspace_root=None):
     return CONFIG.get(key, default_value)
 
 
+def autocomplete(parser, **kwargs):
+    """Run argcomplete, but only import it when the shell is requesting completions."""
+    if '_ARGCOMPLETE' not in os.environ:
+        return
+    import argcomplete
+    argcomplete.autocomplete(parser, **kwargs)
+
+
+def format_duration(dt):
+    hours, remainder = divmod(dt, 3600)
+    minutes, seconds = divmod(remainder, 60)
+    if hours or minutes:
+        hours = int(hours)
+        minutes = int(minutes)
+        seconds = int(seconds)
+        s = f'{minutes:02d}:{seconds:02d}'
+        if hours:
+            return f'{hours}:' + s
+        else:
+            return s
+    else:
+        return f'{seconds:.1f} s'
+
+
 def sizeof_fmt(num, suffix='B'):
     # https://stackoverflow.com/questions/1094841/get-human-readable-version-of-file-size
     BASE = 1024.0
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""Measure how fast rosbuild classifies lines of build output.
+
+Usage: python test/benchmark_classify_line.py [recorded_build_output.log]
+
+Without a log file, synthetic colcon output with compiler warnings is used. The status and skip patterns are
+compared with the previous implementation, which tried every pattern on every line. The full processing (which now
+also parses the diagnostics) is compared with the previous processing, which only classified the lines and kept the
+error lines.
+"""
+import random
+import re
+import sys
+import time
+
+from ros_command.build_tool import SKIPPABLE_PATTERN, STATUS_MARKERS, STATUS_PATTERN, BuildStatus
+
+PKG_PATTERN = r'\s+([\w\-]+)\s+'
+BRACKET_PATTERN = r'\[\s*(.*)\s*\]\s*'
+PREVIOUS_STATUS_PATTERNS = [
+    ('start', re.compile(r'Starting *>>>' + PKG_PATTERN)),
+    ('stop', re.compile(r'Finished *<<<' + PKG_PATTERN + BRACKET_PATTERN)),
+    ('fail', re.compile(r'Failed *<<<' + PKG_PATTERN + BRACKET_PATTERN)),
+    ('abort', re.compile(r'Aborted *<<<' + PKG_PATTERN + BRACKET_PATTERN)),
+    ('abort', re.compile(r'Abandoned *<<<' + PKG_PATTERN + BRACKET_PATTERN))
+]
+PREVIOUS_SKIPPABLE_PATTERNS = [
+    re.compile(r'^Summary:.*'),
+    re.compile(r'^\[build( [\d\.:]+ s)?\].*'),
+    re.compile(r'^\[Processing: .*\]'),
+    re.compile(r'^\s*\d+ packages? ([^\:]+):.*'),
+    re.compile(r'^\s+\d+ packages? not processed.*')
+]
+
+
+def classify_previous(line):
+    for pattern in PREVIOUS_SKIPPABLE_PATTERNS:
+        if pattern.match(line):
+            return
+    for name, pattern in PREVIOUS_STATUS_PATTERNS:
+        m = pattern.search(line)
+        if m:
+            return name
+    return 'error'
+
+
+def process_previous(lines):
+    error_buffer = []
+    for line in lines:
+        if '\r' in line:
+            bits = [bit for bit in line.split('\r') if bit]
+        else:
+            bits = [line]
+        for bit in bits:
+            if classify_previous(bit) == 'error':
+                error_buffer.append(bit.rstrip())
+    return error_buffer
+
+
+def classify(line):
+    if SKIPPABLE_PATTERN.match(line):
+        return
+    if STATUS_MARKERS[0] in line or STATUS_MARKERS[1] in line:
+        m = STATUS_PATTERN.search(line)
+        if m:
+            return 'start' if m.group('start_pkg') else m.group('end_verb')
+    return 'error'
+
+
+def generate_output(n_packages=400, lines_per_package=500):
+    rng = random.Random(0)
+    lines = []
+    for i in range(n_packages):
+        pkg = f'package_{i}'
+        lines.append(f'Starting >>> {pkg}\n')
+        lines.append(f'--- stderr: {pkg}\n')
+        for j in range(lines_per_package):
+            kind = rng.random()
+            if kind < 0.5:
+                lines.append(f'/ws/src/{pkg}/src/file_{j % 20}.cpp:{j}:5: warning: unused variable '
+                             f'‘x{j}’ [-Wunused-variable]\n')
+                lines.append(f'  {j} |     int x{j};\n')
+                lines.append('      |         ^\n')
+            elif kind < 0.6:
+                lines.append(f'[build {i * 0.5:.1f} s] [{i}/{n_packages} complete] [{j} ongoing]\n')
+            else:
+                lines.append(f'[{j % 100:3}%] Building CXX object CMakeFiles/{pkg}.dir/src/file_{j}.cpp.o\n')
+        lines.append('---\n')
+        lines.append(f'Finished <<< {pkg} [{rng.random() * 60:.1f}s]\n')
+    lines.append(f'Summary: {n_packages} packages finished [5min 3s]\n')
+    return lines
+
+
+def measure(name, function, lines, repeat=5):
+    """Print the best time of several runs."""
+    elapsed = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function(lines)
+        elapsed = min(elapsed, time.perf_counter() - start)
+    print(f'{name:<30} {elapsed:6.3f} s {len(lines) / elapsed / 1e6:6.2f} M lines/s')
+
+
+def main():
+    if len(sys.argv) > 1:
+        with open(sys.argv[1], errors='replace') as f:
+            lines = f.readlines()
+    else:
+        lines = generate_output()
+    print(f'{len(lines)} lines')
+
+    previous = [classify_previous(line) for line in lines]
+    current = [classify(line) for line in lines]
+    mismatches = sum(1 for a, b in zip(previous, current) if (a is None) != (b is None))
+    if mismatches:
+        print(f'{mismatches} lines are skipped by only one of the implementations')
+
+    measure('previous patterns', lambda lines: [classify_previous(line) for line in lines], lines)
+    measure('current patterns', lambda lines: [classify(line) for line in lines], lines)
+    measure('previous processing', process_previous, lines)
+    measure('BuildStatus.out_batch_callback', lambda lines: BuildStatus().out_batch_callback(lines), lines)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""Measure the CPU time of drawing a frame of the rosbuild interface.
+
+Usage: python test/benchmark_display.py [WIDTH HEIGHT]
+
+The build has 300 packages (12 of them active) and 2000 lines of errors. Frames are measured both with a new error
+line each time (which scrolls the whole error log) and with only the clock and spinners changing.
+"""
+import asyncio
+import io
+import sys
+import time
+
+import blessed
+
+import ros_command.terminal_display
+from ros_command.build_status_display import BuildStatusDisplay
+from ros_command.build_tool import BuildStatus
+
+N_FRAMES = 50
+N_WARMUP_FRAMES = 20
+
+
+def get_terminal_class(width, height):
+    class BenchmarkTerminal(blessed.Terminal):
+        """Terminal with a fixed size that always outputs escape sequences, even when stdout is not a terminal."""
+
+        def __init__(self, *args, **kwargs):
+            super().__init__(kind='xterm-256color', force_styling=True)
+
+        @property
+        def width(self):
+            return width
+
+        @property
+        def height(self):
+            return height
+
+    return BenchmarkTerminal
+
+
+def measure(display, status, new_lines):
+    for i in range(N_WARMUP_FRAMES + N_FRAMES):
+        if i == N_WARMUP_FRAMES:
+            start = time.perf_counter()
+        if new_lines:
+            status.add_error_line(f'/ws/src/pkg/src/new_{i}.cpp:1:1: error: expected ‘;’')
+        display.header.marquee.advance()
+        display.show()
+    return (time.perf_counter() - start) / N_FRAMES
+
+
+async def main(width, height):
+    ros_command.terminal_display.Terminal = get_terminal_class(width, height)
+    status = BuildStatus()
+    status.set_dependencies({f'package_number_{i}': set() for i in range(300)})
+    for i in range(12):
+        status.start(f'package_number_{i}')
+    for i in range(2000):
+        status.add_error_line(f'/ws/src/pkg/src/file_{i}.cpp:12:5: warning: unused variable ‘x{i}’ '
+                              '[-Wunused-variable]')
+
+    stdout = sys.stdout
+    sys.stdout = io.StringIO()
+    try:
+        display = BuildStatusDisplay(status)
+        new_line_time = measure(display, status, True)
+        idle_time = measure(display, status, False)
+        display.finish()
+    finally:
+        sys.stdout = stdout
+
+    print(f'{width}x{height}: {new_line_time * 1e3:.2f} ms per frame with a new error line, '
+          f'{idle_time * 1e3:.2f} ms per frame otherwise')
+
+
+if __name__ == '__main__':
+    width, height = (int(arg) for arg in sys.argv[1:3]) if len(sys.argv) > 2 else (120, 40)
+    asyncio.run(main(width, height))
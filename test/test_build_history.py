@@ -0,0 +1,76 @@
+import multiprocessing
+import os
+import subprocess
+import sys
+
+import pytest
+
+from ros_command.build_history import BuildHistory, get_package_memory
+from ros_command.build_tool import BuildStatus
+
+
+def get_status():
+    status = BuildStatus()
+    status.set_dependencies({'a': set(), 'b': {'a'}})
+    status.start('a')
+    status.stop('a')
+    status.start('b')
+    status.fail('b')
+    status.peak_memory['a'] = 1 << 30
+    return status
+
+
+def record_build(path, barrier):
+    barrier.wait()
+    assert BuildHistory(path).record_build('/ws', get_status(), 0, 'Release')
+
+
+def test_record_build(tmp_path):
+    history = BuildHistory(tmp_path / 'history.db')
+    assert history.record_build('/ws', get_status(), 1, 'Debug')
+
+    builds = history.get_builds('/ws', 10)
+    assert len(builds) == 1
+    assert builds[0]['return_code'] == 1
+    assert builds[0]['cmake_build_type'] == 'Debug'
+    results = {pkg: result for pkg, start, stop, result in history.get_package_builds(builds[0]['id'])}
+    assert results == {'a': 'finished', 'b': 'failed'}
+    assert history.get_peak_memory('/ws') == {'a': 1 << 30}
+    assert history.get_builds('/other', 10) == []
+
+
+def test_concurrent_creation(tmp_path):
+    path = tmp_path / 'history.db'
+    n = 8
+    barrier = multiprocessing.Barrier(n)
+    processes = [multiprocessing.Process(target=record_build, args=(path, barrier)) for _ in range(n)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+    assert [process.exitcode for process in processes] == [0] * n
+    assert len(BuildHistory(path).get_builds('/ws', 100)) == n
+
+
+@pytest.mark.skipif(not os.path.exists('/proc/self/statm'), reason='requires /proc')
+def test_get_package_memory(tmp_path):
+    build_folder = tmp_path / 'build'
+    folders = [build_folder / 'a', build_folder / 'a' / 'CMakeFiles', build_folder / 'b', tmp_path / 'src' / 'a']
+    for folder in folders:
+        folder.mkdir(parents=True)
+    # Processes in the build folder of a (and its subfolders), b and a folder outside of the build folder
+    allocate = 'import sys, time; data = bytearray(int(sys.argv[1])); print(flush=True); time.sleep(30)'
+    processes = [subprocess.Popen([sys.executable, '-c', allocate, str(size)], cwd=folder, stdout=subprocess.PIPE)
+                 for folder, size in zip(folders, [100 << 20, 10 << 20, 10 << 20, 10 << 20])]
+    try:
+        for process in processes:
+            process.stdout.readline()
+        memory = get_package_memory(build_folder, {'a', 'b', 'c'})
+    finally:
+        for process in processes:
+            process.kill()
+            process.wait()
+
+    assert sorted(memory) == ['a', 'b']
+    assert memory['a'] > 110 << 20
+    assert 10 << 20 < memory['b'] < memory['a'] - (90 << 20)
@@ -0,0 +1,97 @@
+from ros_command.build_tool import BuildStatus
+
+# a <- b <- c, a <- d, and e on its own
+UPSTREAM = {'a': set(), 'b': {'a'}, 'c': {'b'}, 'd': {'a', 'outside'}, 'e': set()}
+
+
+def get_status():
+    status = BuildStatus()
+    status.set_dependencies(UPSTREAM)
+    return status
+
+
+def test_initial_states():
+    status = get_status()
+    assert status.states == {'a': 'queued', 'b': 'blocked', 'c': 'blocked', 'd': 'blocked', 'e': 'queued'}
+    assert list(status.pkg_lists['queued']) == ['a', 'e']
+    # Dependencies outside of the build are ignored
+    assert status.dependencies['d'] == {'a'}
+
+
+def test_unblock_downstream():
+    status = get_status()
+    status.start('a')
+    assert list(status.pkg_lists['active']) == ['a']
+    status.stop('a')
+    assert status.states['a'] == 'finished'
+    assert status.states['b'] == 'queued'
+    assert status.states['c'] == 'blocked'
+    assert status.states['d'] == 'queued'
+    assert 'a' in status.durations
+
+
+def test_stop_inactive():
+    status = get_status()
+    status.stop('b')
+    assert status.states['b'] == 'blocked'
+
+
+def test_fail_skips_downstream():
+    status = get_status()
+    status.start('a')
+    status.start('e')
+    status.fail('a')
+    assert status.states == {'a': 'failed', 'b': 'skipped', 'c': 'skipped', 'd': 'skipped', 'e': 'active'}
+    assert not status.upstream_deps
+
+
+def test_abort():
+    status = get_status()
+    status.start('a')
+    status.abort('a')
+    assert status.states['a'] == 'skipped'
+    assert 'a' in status.stop_times
+    status.abort('b')
+    assert status.states['b'] == 'skipped'
+    assert 'b' not in status.upstream_deps
+
+    # Packages that already stopped are left alone
+    status.start('e')
+    status.stop('e')
+    status.abort('e')
+    assert status.states['e'] == 'finished'
+
+
+def test_listeners():
+    status = BuildStatus()
+    changes = []
+    status.add_listener(lambda *args: changes.append(args))
+    status.set_dependencies({'a': set(), 'b': {'a'}})
+    status.start('a')
+    status.stop('a')
+    assert changes == [('a', None, 'queued'), ('b', None, 'blocked'), ('a', 'queued', 'active'),
+                       ('a', 'active', 'finished'), ('b', 'blocked', 'queued')]
+
+
+def test_replay_pending_events():
+    status = BuildStatus()
+    status.classify_line('Starting >>> a\n')
+    status.classify_line('Finished <<< a [1.0s]\n')
+    status.classify_line('Starting >>> b\n')
+    assert not status.states
+
+    status.set_dependencies(UPSTREAM)
+    assert status.pending_events is None
+    assert status.states['a'] == 'finished'
+    assert status.states['b'] == 'active'
+    assert status.states['d'] == 'queued'
+    # The replayed events keep the times they were received at
+    assert status.start_times['a'] <= status.stop_times['a'] <= status.start_times['b']
+
+
+def test_replay_pending_failure():
+    status = BuildStatus()
+    status.classify_line('Starting >>> a\n')
+    status.classify_line('Failed <<< a [1.0s]\n')
+    status.set_dependencies(UPSTREAM)
+    assert status.states == {'a': 'failed', 'b': 'skipped', 'c': 'skipped', 'd': 'skipped', 'e': 'queued'}
@@ -0,0 +1,36 @@
+from ros_command.build_trace import get_command_phase, get_lanes, parse_colcon_events
+
+
+def test_get_lanes():
+    spans = [('a', 0.0, 10.0), ('b', 1.0, 3.0), ('c', 2.0, 4.0), ('d', 3.0, 5.0), ('e', 11.0, 12.0)]
+    # d reuses the lane b finished on, and e the first lane
+    assert get_lanes(spans) == {'a': 1, 'b': 2, 'c': 3, 'd': 2, 'e': 1}
+
+
+def test_get_lanes_unsorted():
+    assert get_lanes([('b', 5.0, 6.0), ('a', 0.0, 5.0)]) == {'a': 1, 'b': 1}
+    assert get_lanes([]) == {}
+
+
+def test_get_command_phase():
+    assert get_command_phase(['/usr/bin/cmake', '/ws/src/a', '-DCMAKE_BUILD_TYPE=Release']) == 'configure'
+    assert get_command_phase(['/usr/bin/cmake', '--build', '/ws/build/a']) == 'build'
+    assert get_command_phase(['/usr/bin/cmake', '--install', '/ws/build/a']) == 'install'
+    assert get_command_phase(['/usr/bin/python3', 'setup.py', 'build']) == 'python3'
+    assert get_command_phase([]) == 'command'
+
+
+def test_parse_colcon_events(tmp_path):
+    path = tmp_path / 'events.log'
+    path.write_text(
+        "[0.000000] (-) TimerEvent: {}\n"
+        "[0.100000] (a) JobStarted: {'identifier': 'a'}\n"
+        "[0.200000] (a) Command: {'cmd': ['/usr/bin/cmake', '/ws/src/a'], 'cwd': '/ws/build/a'}\n"
+        "[1.200000] (a) CommandEnded: {'cmd': ['/usr/bin/cmake', '/ws/src/a'], 'cwd': '/ws/build/a'}\n"
+        "[1.300000] (a) Command: {'cmd': ['/usr/bin/cmake', '--build', '/ws/build/a'], 'cwd': '/ws/build/a'}\n"
+        "[4.300000] (a) CommandEnded: {'cmd': ['/usr/bin/cmake', '--build', '/ws/build/a'], 'returncode': 0}\n"
+        "[4.400000] (b) JobStarted: {'identifier': 'b'}\n"
+    )
+    job_starts, commands = parse_colcon_events(path)
+    assert job_starts == {'a': 0.1, 'b': 4.4}
+    assert commands == [('a', 'configure', 0.2, 1.2), ('a', 'build', 1.3, 4.3)]
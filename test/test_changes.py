@@ -0,0 +1,77 @@
+import pathlib
+import subprocess
+
+from ros_command.build_tool import PackageInfo
+from ros_command.changes import find_git_repos, get_changed_files, get_downstream_closure, get_owning_package
+
+# a <- b <- c, a <- d (only for testing), and e on its own
+PACKAGES = {
+    'a': PackageInfo('/ws/src/a', set(), set()),
+    'b': PackageInfo('/ws/src/b', {'a'}, set()),
+    'c': PackageInfo('/ws/src/c', {'b'}, set()),
+    'd': PackageInfo('/ws/src/d', set(), {'a'}),
+    'e': PackageInfo('/ws/src/e', set(), set()),
+}
+
+
+def git(repo, *args):
+    subprocess.run(['git', '-c', 'user.name=test', '-c', 'user.email=test@example.com'] + list(args), cwd=repo,
+                   check=True, stdout=subprocess.DEVNULL)
+
+
+def test_get_owning_package():
+    package_paths = {pathlib.Path('/ws/src/repo/a'): 'a', pathlib.Path('/ws/src/repo/a/nested'): 'nested',
+                     pathlib.Path('/ws/src/b'): 'b'}
+    assert get_owning_package(pathlib.Path('/ws/src/repo/a/src/a.cpp'), package_paths) == 'a'
+    # Files in a package within another package belong to the innermost package
+    assert get_owning_package(pathlib.Path('/ws/src/repo/a/nested/package.xml'), package_paths) == 'nested'
+    assert get_owning_package(pathlib.Path('/ws/src/repo/README.md'), package_paths) is None
+    assert get_owning_package(pathlib.Path('/ws/src/bb/b.cpp'), package_paths) is None
+
+
+def test_get_downstream_closure():
+    assert get_downstream_closure(PACKAGES, ['a']) == {'a', 'b', 'c', 'd'}
+    assert get_downstream_closure(PACKAGES, ['b', 'e']) == {'b', 'c', 'e'}
+    assert get_downstream_closure(PACKAGES, ['c']) == {'c'}
+    assert get_downstream_closure(PACKAGES, []) == set()
+
+
+def test_find_git_repos(tmp_path):
+    src = tmp_path / 'src'
+    for folder in ['repo_a/.git', 'repo_a/pkg/.git', 'group/repo_b/.git', 'group/not_a_repo', '.hidden/.git']:
+        (src / folder).mkdir(parents=True)
+    # Submodules and worktrees have a .git file instead of a folder
+    (src / 'group' / 'worktree').mkdir()
+    (src / 'group' / 'worktree' / '.git').write_text('gitdir: /elsewhere')
+
+    # Repos within repos and hidden folders are skipped
+    expected = [src / 'group' / 'repo_b', src / 'group' / 'worktree', src / 'repo_a']
+    assert sorted(find_git_repos(tmp_path, src)) == expected
+
+    # The whole workspace can be one repository
+    (tmp_path / '.git').mkdir()
+    assert find_git_repos(tmp_path, src) == [tmp_path]
+
+
+def test_get_changed_files(tmp_path):
+    for name in ['a/package.xml', 'a/src/a.cpp', 'b/package.xml']:
+        (tmp_path / name).parent.mkdir(parents=True, exist_ok=True)
+        (tmp_path / name).write_text(name)
+    git(tmp_path, 'init', '-q')
+    git(tmp_path, 'add', '.')
+    git(tmp_path, 'commit', '-q', '-m', 'Initial commit')
+
+    assert get_changed_files(tmp_path, 'HEAD') == []
+    assert get_changed_files(tmp_path, 'no_such_ref') is None
+
+    # Modified, deleted and untracked files are all included
+    (tmp_path / 'a' / 'src' / 'a.cpp').unlink()
+    (tmp_path / 'b' / 'package.xml').write_text('changed')
+    (tmp_path / 'b' / 'new.cpp').write_text('')
+    changed = get_changed_files(tmp_path, 'HEAD')
+    assert sorted(changed) == [tmp_path / 'a' / 'src' / 'a.cpp', tmp_path / 'b' / 'new.cpp',
+                               tmp_path / 'b' / 'package.xml']
+
+    # Deleted files still belong to the package that contained them
+    package_paths = {tmp_path / 'a': 'a', tmp_path / 'b': 'b'}
+    assert {get_owning_package(path, package_paths) for path in changed} == {'a', 'b'}
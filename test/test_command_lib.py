@@ -0,0 +1,53 @@
+import asyncio
+import sys
+
+from ros_command.command_lib import _read_stream, run
+
+
+def read_stream(chunks, max_line_length=100):
+    """Return the batches of lines read from a stream that receives the chunks."""
+    batches = []
+
+    async def read():
+        stream = asyncio.StreamReader()
+        for chunk in chunks:
+            stream.feed_data(chunk)
+        stream.feed_eof()
+        await _read_stream(stream, batches.append, max_line_length)
+
+    asyncio.run(read())
+    return batches
+
+
+def test_read_stream_lines():
+    assert read_stream([b'one\ntwo\nthree\n']) == [['one\n', 'two\n', 'three\n']]
+
+
+def test_read_stream_partial_lines():
+    lines = sum(read_stream([b'on', b'e\ntw', b'o\n', b'three']), [])
+    assert lines == ['one\n', 'two\n', 'three']
+
+
+def test_read_stream_empty():
+    assert read_stream([]) == []
+
+
+def test_read_stream_long_lines():
+    lines = sum(read_stream([b'a' * 25 + b'\n' + b'b' * 25], max_line_length=10), [])
+    assert lines == ['a' * 10, 'a' * 10, 'a' * 5 + '\n', 'b' * 10, 'b' * 10, 'b' * 5]
+
+
+def test_read_stream_invalid_utf8():
+    lines = sum(read_stream([b'caf\xc3\xa9\n', b'bad \xff\n']), [])
+    assert lines == ['café\n', 'bad �\n']
+
+
+def test_run_callbacks():
+    stdout = []
+    stderr = []
+    script = 'import sys; print("out1"); print("out2"); print("err", file=sys.stderr); sys.exit(3)'
+    code = asyncio.run(run([sys.executable, '-c', script], stdout_callback=stdout.append,
+                           stderr_batch_callback=stderr.extend))
+    assert code == 3
+    assert stdout == ['out1\n', 'out2\n']
+    assert stderr == ['err\n']
@@ -0,0 +1,64 @@
+import json
+
+import pytest
+
+from ros_command.compiler_cache import parse_ccache_stats, parse_sccache_stats
+
+# Output of ccache --print-stats (ccache 4.8), trimmed
+CCACHE_STATS = """stats_updated_timestamp\t1718031245
+stats_zeroed_timestamp\t0
+autoconf_test\t0
+bad_compiler_arguments\t2
+cache_miss\t37
+cache_size_kibibyte\t51236
+called_for_link\t4
+called_for_preprocessing\t0
+compile_failed\t1
+direct_cache_hit\t120
+direct_cache_miss\t40
+files_in_cache\t412
+preprocessed_cache_hit\t3
+preprocessed_cache_miss\t37
+preprocessor_error\t0
+"""
+
+# Output of sccache --show-stats --stats-format=json (sccache 0.7), trimmed
+SCCACHE_STATS = {
+    'stats': {
+        'compile_requests': 162,
+        'requests_executed': 158,
+        'cache_errors': {'counts': {}, 'adv_counts': {}},
+        'cache_hits': {'counts': {'C/C++': 98, 'CUDA': 2}, 'adv_counts': {'c/c++': 98, 'cuda': 2}},
+        'cache_misses': {'counts': {'C/C++': 56}, 'adv_counts': {'c/c++': 56}},
+        'cache_timeouts': 0,
+        'cache_read_errors': 0,
+        'non_cacheable_compilations': 0,
+        'non_cacheable_calls': 4,
+        'non_compilation_calls': 0,
+        'compile_fails': 2,
+    },
+    'cache_location': 'Local disk: "/ws/.compiler_cache"',
+    'cache_size': 52465664,
+    'max_cache_size': 5368709120,
+}
+
+
+def test_parse_ccache_stats():
+    assert parse_ccache_stats(CCACHE_STATS) == (123, 37)
+    # Counters that have not been recorded yet are left out by older versions
+    assert parse_ccache_stats('stats_zeroed_timestamp\t0\n') == (0, 0)
+
+
+def test_parse_sccache_stats():
+    assert parse_sccache_stats(json.dumps(SCCACHE_STATS)) == (100, 56)
+
+    stats = json.loads(json.dumps(SCCACHE_STATS))
+    stats['stats']['cache_hits']['counts'] = {}
+    assert parse_sccache_stats(json.dumps(stats)) == (0, 56)
+
+
+@pytest.mark.parametrize('s', ['', 'Compile requests  162', '{"cache_size": 0}'])
+def test_parse_sccache_stats_invalid(s):
+    # get_cache_stats ignores these errors
+    with pytest.raises((KeyError, ValueError)):
+        parse_sccache_stats(s)
@@ -0,0 +1,95 @@
+import pytest
+
+from ros_command.build_tool import BuildStatus, Diagnostic, parse_diagnostic
+
+CMAKE_WARNING = """CMake Warning at /ws/src/a/cmake/util.cmake:12 (message):
+  {} not found
+Call Stack (most recent call first):
+  CMakeLists.txt:5 (include)
+
+"""
+
+
+@pytest.mark.parametrize('line, expected', [
+    ('/ws/src/a/src/a.cpp:12:5: warning: unused variable ‘x’ [-Wunused-variable]',
+     Diagnostic('/ws/src/a/src/a.cpp', 12, 'warning', 'unused variable ‘x’ [-Wunused-variable]', 'a')),
+    ('/ws/src/a/src/a.cpp:3: error: expected ‘;’',
+     Diagnostic('/ws/src/a/src/a.cpp', 3, 'error', 'expected ‘;’', 'a')),
+    ('a.h:1:10: fatal error: b.h: No such file or directory',
+     Diagnostic('a.h', 1, 'error', 'b.h: No such file or directory', 'a')),
+    ('a.h:2:1: note: declared here', Diagnostic('a.h', 2, 'note', 'declared here', 'a')),
+    ('CMake Error at CMakeLists.txt:3 (find_package):',
+     Diagnostic('CMakeLists.txt', 3, 'error', '(find_package):', 'a')),
+    ('CMake Warning (dev) at CMakeLists.txt:1 (project):',
+     Diagnostic('CMakeLists.txt', 1, 'warning', '(project):', 'a')),
+    ('CMake Deprecation Warning at CMakeLists.txt:1 (cmake_minimum_required):',
+     Diagnostic('CMakeLists.txt', 1, 'warning', '(cmake_minimum_required):', 'a')),
+    ('[ 50%] Building CXX object CMakeFiles/a.dir/src/a.cpp.o', None),
+    ('Starting >>> a', None),
+    ('  12 |     int x;', None),
+])
+def test_parse_diagnostic(line, expected):
+    assert parse_diagnostic(line, 'a') == expected
+
+
+def classify(status, s):
+    for line in s.split('\n'):
+        status.classify_line(line)
+
+
+def test_repeated_diagnostics():
+    status = BuildStatus()
+    s = ('In file included from /ws/src/a/src/a.cpp:1:\n'
+         '/ws/src/a/include/a.h:3:5: warning: unused variable ‘x’ [-Wunused-variable]\n'
+         '    3 |     int x;\n'
+         '      |         ^\n')
+    classify(status, s)
+    classify(status, s.replace('a.cpp', 'b.cpp'))
+    classify(status, '/ws/src/a/src/c.cpp:1:1: error: expected ‘;’')
+
+    # The repeated warning is only kept once, along with its context
+    assert list(status.error_buffer) == s.split('\n') + ['/ws/src/a/src/c.cpp:1:1: error: expected ‘;’']
+    assert status.diagnostic_counts[None] == {'warning': 1, 'error': 1}
+    assert status.get_diagnostic_summary() == 'E1 W1'
+
+
+def test_cmake_diagnostics():
+    status = BuildStatus()
+    for lib in ['libA', 'libB', 'libA']:
+        classify(status, CMAKE_WARNING.format(lib))
+    classify(status, 'CMake Error at CMakeLists.txt:3 (find_package):')
+    status.add_pending_diagnostic()
+
+    # Different messages from the same call site are counted separately, and repeats are left out entirely
+    assert list(status.error_buffer) == (CMAKE_WARNING.format('libA').split('\n')
+                                         + CMAKE_WARNING.format('libB').split('\n')
+                                         + ['CMake Error at CMakeLists.txt:3 (find_package):'])
+    messages = {diagnostic.message: count for diagnostic, count in status.diagnostics.items()}
+    assert messages == {'(message): libA not found': 2, '(message): libB not found': 1, '(find_package):': 1}
+
+
+def test_catkin_tools_sections():
+    status = BuildStatus()
+    classify(status, """Starting  >>> pkg_a
+_______________________________________________________________________________
+Warnings   << pkg_a:make /ws/logs/pkg_a/build.make.000.log
+/ws/src/pkg_a/src/a.cpp:3:5: warning: unused variable ‘x’ [-Wunused-variable]
+...............................................................................
+Finished  <<< pkg_a                [ 2.1 seconds ]
+_______________________________________________________________________________
+Errors     << pkg-b:make /ws/logs/pkg-b/build.make.000.log
+/ws/src/pkg-b/src/b.cpp:1:1: error: expected ‘;’
+make[2]: *** [CMakeFiles/b.dir/build.make:76: CMakeFiles/b.dir/src/b.cpp.o] Error 1
+...............................................................................
+Failed     << pkg-b:make           [ Exited with code 2 ]
+/ws/src/c.cpp:1:1: warning: outside of any section""")
+    assert status.diagnostic_counts == {'pkg_a': {'warning': 1}, 'pkg-b': {'error': 1}, None: {'warning': 1}}
+
+
+def test_colcon_sections():
+    status = BuildStatus()
+    classify(status, """--- stderr: pkg_a
+/ws/src/pkg_a/src/a.cpp:3:5: warning: unused variable ‘x’ [-Wunused-variable]
+---
+/ws/src/c.cpp:1:1: warning: outside of any section""")
+    assert status.diagnostic_counts == {'pkg_a': {'warning': 1}, None: {'warning': 1}}
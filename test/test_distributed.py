@@ -0,0 +1,118 @@
+import asyncio
+import os
+import sys
+
+import pytest
+
+from ros_command.distributed import assign_packages, get_waves, get_worker_command, run_distributed
+
+# a <- b <- d, a <- c <- d, and e on its own
+UPSTREAM = {'a': set(), 'b': {'a'}, 'c': {'a'}, 'd': {'b', 'c'}, 'e': {'outside'}}
+
+# Stands in for colcon build, printing the same status lines for each package it is asked to build
+FAKE_COLCON = """#!{python}
+import os
+import sys
+args = sys.argv[1:]
+log_base = args[args.index('--log-base') + 1]
+packages = args[args.index('--packages-select') + 1:]
+code = 0
+for pkg in packages:
+    print(f'Starting >>> {{pkg}} ({{log_base}})')
+    if pkg in os.environ.get('FAIL_PACKAGES', '').split():
+        print(f'Failed <<< {{pkg}} [0.1s]')
+        code = 1
+    else:
+        print(f'Finished <<< {{pkg}} [0.1s]')
+sys.exit(code)
+"""
+
+
+def test_get_waves():
+    assert get_waves(UPSTREAM) == [{'a', 'e'}, {'b', 'c'}, {'d'}]
+    assert get_waves({}) == []
+
+
+def test_get_waves_circular():
+    with pytest.raises(RuntimeError):
+        get_waves({'a': {'b'}, 'b': {'a'}, 'c': set()})
+
+
+def test_assign_packages():
+    durations = {'a': 10.0, 'b': 6.0, 'c': 5.0, 'd': 4.0}
+    assert assign_packages(['a', 'b', 'c', 'd'], 2, durations) == [['a', 'd'], ['b', 'c']]
+    # Packages without a recorded duration are assumed to take the median duration
+    assert assign_packages(['a', 'b', 'e'], 2, {'a': 10.0, 'b': 2.0}) == [['a'], ['e', 'b']]
+    # Without durations, the packages are spread evenly
+    assert assign_packages(['a', 'b', 'c'], 2) == [['a', 'c'], ['b']]
+    assert assign_packages(['a'], 3) == [['a'], [], []]
+
+
+def test_get_worker_command():
+    command = ['colcon', 'build', '--packages-select', 'a']
+    assert get_worker_command(command, 2) == ['colcon', '--log-base', 'log/worker_2', 'build', '--packages-select', 'a']
+
+
+def run_fake_build(tmp_path, upstream=UPSTREAM, workers=2, fail_packages='', continue_on_failure=False):
+    """Return the return code and the status lines printed by the worker processes."""
+    colcon = tmp_path / 'colcon'
+    colcon.write_text(FAKE_COLCON.format(python=sys.executable))
+    colcon.chmod(0o755)
+    lines = []
+
+    def generate_command(selection_args):
+        return [str(colcon), 'build'] + selection_args
+
+    env = dict(os.environ, FAIL_PACKAGES=fail_packages)
+    code = asyncio.run(run_distributed(upstream, workers, generate_command, cwd=tmp_path, env=env,
+                                       stdout_batch_callback=lines.extend, continue_on_failure=continue_on_failure))
+    return code, [line.split() for line in lines]
+
+
+def get_started(lines):
+    return {words[2] for words in lines if words[0] == 'Starting'}
+
+
+def test_run_distributed(tmp_path):
+    code, lines = run_fake_build(tmp_path)
+    assert code == 0
+    events = [(words[0], words[2]) for words in lines]
+    assert sorted(events) == sorted([(verb, pkg) for pkg in UPSTREAM for verb in ['Finished', 'Starting']])
+    # Each package only starts once its dependencies in the build have finished
+    for pkg, deps in UPSTREAM.items():
+        for dep in deps & UPSTREAM.keys():
+            assert events.index(('Finished', dep)) < events.index(('Starting', pkg))
+
+
+def test_run_distributed_worker_logs(tmp_path):
+    code, lines = run_fake_build(tmp_path, {'a': set(), 'b': set()})
+    # Each worker has its own log folder
+    log_bases = sorted(words[3] for words in lines if words[0] == 'Starting')
+    assert log_bases == ['(log/worker_0)', '(log/worker_1)']
+
+
+def test_run_distributed_failure(tmp_path):
+    code, lines = run_fake_build(tmp_path, fail_packages='e')
+    assert code == 1
+    # The build stops after the wave with the failure
+    assert get_started(lines) == {'a', 'e'}
+
+
+def test_run_distributed_continue_on_failure(tmp_path):
+    code, lines = run_fake_build(tmp_path, fail_packages='e', continue_on_failure=True)
+    assert code == 1
+    assert get_started(lines) == {'a', 'b', 'c', 'd', 'e'}
+
+    # Everything downstream of the failed package is left out
+    code, lines = run_fake_build(tmp_path, fail_packages='c', continue_on_failure=True)
+    assert code == 1
+    assert get_started(lines) == {'a', 'b', 'c', 'e'}
+
+
+def test_run_distributed_partial_worker_failure(tmp_path):
+    # With one worker, the failed package shares its worker with a package that still finishes
+    upstream = {'a': set(), 'b': set(), 'c': {'a'}, 'd': {'b'}}
+    code, lines = run_fake_build(tmp_path, upstream, workers=1, fail_packages='b', continue_on_failure=True)
+    assert code == 1
+    # Only the packages downstream of the failed package are left out
+    assert get_started(lines) == {'a', 'b', 'c'}
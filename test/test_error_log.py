@@ -0,0 +1,49 @@
+from ros_command.error_log import BLOCK_SIZE, KEEP_BUILDS, ErrorLog, get_log_folders, read_error_log
+
+
+def read_lines(folder, pkg=None):
+    return ''.join(read_error_log(folder, pkg)).splitlines()
+
+
+def test_round_trip(tmp_path):
+    log = ErrorLog(tmp_path)
+    lines = {'a': [], 'b': [], None: []}
+    # Enough lines to span several blocks, interleaved between the packages
+    for i in range(3 * BLOCK_SIZE // 40):
+        for pkg in lines:
+            line = f'/ws/src/{pkg}/src/file.cpp:{i}:1: warning: ünused variable ‘x{i}’'
+            lines[pkg].append(line)
+            log.add_line(pkg, line)
+    log.close()
+
+    assert get_log_folders(tmp_path) == [log.folder]
+    assert len(log.index['a']) > 1
+    assert read_lines(log.folder, 'a') == lines['a']
+    assert read_lines(log.folder, 'b') == lines['b']
+    assert read_lines(log.folder, 'c') == []
+    # All the lines, in sections with a header for each package
+    all_lines = read_lines(log.folder)
+    for header, pkg in [('=== a ===', 'a'), ('=== b ===', 'b'), ('=== (no package) ===', None)]:
+        start = all_lines.index(header) + 1
+        assert all_lines[start:start + len(lines[pkg])] == lines[pkg]
+    assert len(all_lines) == 3 + 3 * len(lines['a'])
+
+
+def test_keep_builds(tmp_path):
+    logs = []
+    for i in range(KEEP_BUILDS + 3):
+        log = ErrorLog(tmp_path)
+        log.add_line('a', f'build {i}')
+        log.close()
+        logs.append(log)
+
+    # Only the most recent builds are kept
+    folders = get_log_folders(tmp_path)
+    assert folders == [log.folder for log in logs[-KEEP_BUILDS:]]
+    assert read_lines(folders[-1], 'a') == [f'build {KEEP_BUILDS + 2}']
+
+    # A build that is still running is not complete, but counts towards the builds to keep
+    running = ErrorLog(tmp_path)
+    assert get_log_folders(tmp_path) == folders[1:]
+    assert get_log_folders(tmp_path, complete_only=False) == folders[1:] + [running.folder]
+    running.close()
@@ -0,0 +1,42 @@
+import pathlib
+import re
+import subprocess
+import sys
+
+import pytest
+
+PYPROJECT_PATH = pathlib.Path(__file__).parent.parent / 'pyproject.toml'
+# Upper bound on the cumulative import time of each entry point, in seconds
+IMPORT_TIME_LIMIT = 0.5
+# Modules that should only be imported on the code paths that use them
+HEAVY_MODULES = ['argcomplete', 'blessed', 'catkin_pkg', 'rosdep2', 'sqlite3', 'yaml']
+
+
+def get_entry_point_modules():
+    s = PYPROJECT_PATH.read_text()
+    section = s.split('[project.scripts]', 1)[1].split('\n[', 1)[0]
+    return sorted({m.group(1) for m in re.finditer(r'=\s*"([\w\.]+):\w+"', section)})
+
+
+def get_import_times(module):
+    """Return the cumulative import time in seconds of each module imported by importing the module."""
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+                            stderr=subprocess.PIPE, universal_newlines=True)
+    assert result.returncode == 0, result.stderr
+    times = {}
+    for line in result.stderr.split('\n'):
+        if not line.startswith('import time:'):
+            continue
+        _, cumulative, name = line.split('|')
+        if cumulative.strip().isdigit():
+            times[name.strip()] = int(cumulative) / 1e6
+    return times
+
+
+@pytest.mark.parametrize('module', get_entry_point_modules())
+def test_entry_point_import_time(module):
+    times = get_import_times(module)
+    assert times[module] < IMPORT_TIME_LIMIT
+
+    imported = {name.split('.')[0] for name in times}
+    assert not imported.intersection(HEAVY_MODULES)
@@ -0,0 +1,108 @@
+import os
+
+import pytest
+
+import ros_command.cache
+from ros_command.cache import Cache
+from ros_command.incremental import get_package_signatures, get_source_digest, get_unchanged_packages, save_signatures
+
+MANIFEST = """<?xml version="1.0"?>
+<package format="3">
+  <name>{name}</name>
+  <version>0.0.0</version>
+  <description>{name}</description>
+  <maintainer email="someone@example.com">Someone</maintainer>
+  <license>BSD</license>
+  {deps}
+</package>
+"""
+
+
+@pytest.fixture(autouse=True)
+def cache(tmp_path_factory, monkeypatch):
+    """Use a separate cache for each test."""
+    cache = Cache(tmp_path_factory.mktemp('cache') / 'cache.db', None)
+    monkeypatch.setattr(ros_command.cache, 'THE_CACHE', cache)
+    return cache
+
+
+@pytest.fixture
+def workspace(tmp_path):
+    """Workspace where b depends on a, and c is independent."""
+    root = tmp_path / 'ws'
+    for name, deps in [('a', ''), ('b', '<depend>a</depend>'), ('c', '')]:
+        folder = root / 'src' / name
+        (folder / 'src').mkdir(parents=True)
+        (folder / 'package.xml').write_text(MANIFEST.format(name=name, deps=deps))
+        (folder / 'src' / f'{name}.cpp').write_text('int main() {}\n')
+    return root
+
+
+def test_source_digest(tmp_path):
+    (tmp_path / 'src').mkdir()
+    path = tmp_path / 'src' / 'a.cpp'
+    path.write_text('int x;\n')
+    file_hashes = {}
+    digest = get_source_digest(tmp_path, file_hashes)
+    assert sorted(file_hashes) == [os.path.join('src', 'a.cpp')]
+
+    # Touching the file without changing it keeps the digest
+    st = path.stat()
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+    assert get_source_digest(tmp_path, file_hashes) == digest
+
+    # Editing the file changes it, even if the size stays the same
+    path.write_text('int y;\n')
+    edited_digest = get_source_digest(tmp_path, file_hashes)
+    assert edited_digest != digest
+
+    # So do adding and removing files
+    (tmp_path / 'b.cpp').write_text('')
+    added_digest = get_source_digest(tmp_path, file_hashes)
+    assert added_digest != edited_digest
+    (tmp_path / 'b.cpp').unlink()
+    assert get_source_digest(tmp_path, file_hashes) == edited_digest
+    assert sorted(file_hashes) == [os.path.join('src', 'a.cpp')]
+
+
+def test_source_digest_ignored_folders(tmp_path):
+    (tmp_path / 'a.py').write_text('x = 1\n')
+    digest = get_source_digest(tmp_path, {})
+    for folder in ['__pycache__', '.git']:
+        (tmp_path / folder).mkdir()
+        (tmp_path / folder / 'x').write_text('x')
+    assert get_source_digest(tmp_path, {}) == digest
+
+
+def test_package_signatures(workspace, monkeypatch):
+    pytest.importorskip('catkin_pkg')
+    signatures = get_package_signatures(workspace, ['b', 'c'], ['colcon', 'build'])
+    # The signatures of the dependencies are needed too
+    assert sorted(signatures) == ['a', 'b', 'c']
+    assert get_package_signatures(workspace, ['b', 'c'], ['colcon', 'build']) == signatures
+
+    # Changes upstream change the signatures downstream
+    (workspace / 'src' / 'a' / 'src' / 'a.cpp').write_text('int main() { return 1; }\n')
+    changed = get_package_signatures(workspace, ['b', 'c'], ['colcon', 'build'])
+    assert changed['a'] != signatures['a']
+    assert changed['b'] != signatures['b']
+    assert changed['c'] == signatures['c']
+
+    # As do the build arguments and the underlay
+    assert get_package_signatures(workspace, ['c'], ['colcon', 'build', '--symlink-install'])['c'] != changed['c']
+    monkeypatch.setenv('ROS_DISTRO', os.environ.get('ROS_DISTRO', '') + '_other')
+    assert get_package_signatures(workspace, ['c'], ['colcon', 'build'])['c'] != changed['c']
+
+
+def test_unchanged_packages(workspace):
+    signatures = {'a': 'signature_a', 'b': 'signature_b', 'c': 'signature_c'}
+    assert get_unchanged_packages(workspace, signatures) == set()
+
+    save_signatures(workspace, {'a': 'signature_a', 'b': 'old_signature_b', 'c': 'signature_c'})
+    # Packages are only unchanged if they are still installed, in an isolated or a merged install folder
+    (workspace / 'install' / 'a').mkdir(parents=True)
+    (workspace / 'install' / 'share' / 'b').mkdir(parents=True)
+    assert get_unchanged_packages(workspace, signatures) == {'a'}
+
+    (workspace / 'install' / 'share' / 'c').mkdir(parents=True)
+    assert get_unchanged_packages(workspace, signatures) == {'a', 'c'}
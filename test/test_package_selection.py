@@ -0,0 +1,80 @@
+import pytest
+
+from ros_command.build_tool import PackageInfo, get_workspace_packages, parse_package_selection_args, select_packages
+
+# a <- b <- c, with d only depending on a for its tests
+PACKAGES = {
+    'a': PackageInfo('src/a', set(), set()),
+    'b': PackageInfo('src/b', {'a'}, set()),
+    'c': PackageInfo('src/c', {'b'}, set()),
+    'd': PackageInfo('src/d', set(), {'a'}),
+}
+
+
+@pytest.mark.parametrize('args, expected', [
+    ([], ([], [], False)),
+    (['--packages-up-to', 'c', 'd'], (['c', 'd'], [], False)),
+    (['--packages-select', 'c'], (['c'], [], True)),
+    (['--packages-up-to', 'c', '--packages-skip', 'a', 'b'], (['c'], ['a', 'b'], False)),
+    (['--packages-skip', 'a', '--packages-select', 'c'], (['c'], ['a'], True)),
+    (['--pkg', 'c'], (['c'], [], True)),
+    (['--only-pkg-with-deps', 'c'], (['c'], [], False)),
+    (['-DCATKIN_BLACKLIST_PACKAGES="a;b"'], ([], ['a', 'b'], False)),
+    (['--no-deps', 'c'], (['c'], [], True)),
+])
+def test_parse_package_selection_args(args, expected):
+    assert parse_package_selection_args(args) == expected
+
+
+def test_select_all():
+    assert select_packages(PACKAGES) == {'a': set(), 'b': {'a'}, 'c': {'b'}, 'd': {'a'}}
+
+
+def test_select_up_to():
+    assert select_packages(PACKAGES, ['c']) == {'a': set(), 'b': {'a'}, 'c': {'b'}}
+    # Test dependencies are not needed to build the package
+    assert select_packages(PACKAGES, ['d']) == {'d': set()}
+
+
+def test_select_no_deps():
+    assert select_packages(PACKAGES, ['c', 'unknown'], no_deps=True) == {'c': set()}
+
+
+def test_select_skip():
+    assert select_packages(PACKAGES, ['c'], ['b']) == {'a': set(), 'c': set()}
+    assert select_packages(PACKAGES, skip_packages=['a']) == {'b': set(), 'c': {'b'}, 'd': set()}
+
+
+MANIFEST = """<?xml version="1.0"?>
+<package format="3">
+  <name>{name}</name>
+  <version>0.0.0</version>
+  <description>{name}</description>
+  <maintainer email="someone@example.com">Someone</maintainer>
+  <license>BSD</license>
+  {deps}
+</package>
+"""
+
+
+def test_get_workspace_packages(tmp_path):
+    pytest.importorskip('catkin_pkg')
+    deps = {
+        'a': '<depend>roscpp</depend>',
+        'b': '<build_depend>a</build_depend>',
+        'c': '<exec_depend>b</exec_depend><test_depend>a</test_depend>',
+        'd': '<depend condition="$ROS_VERSION == 0">a</depend>',
+    }
+    for name, dep_s in deps.items():
+        folder = tmp_path / 'src' / name
+        folder.mkdir(parents=True)
+        (folder / 'package.xml').write_text(MANIFEST.format(name=name, deps=dep_s))
+
+    packages = get_workspace_packages(tmp_path)
+    assert sorted(packages) == ['a', 'b', 'c', 'd']
+    # Dependencies outside of the workspace and dependencies whose condition is false are dropped
+    assert packages['a'].deps == set()
+    assert packages['b'].deps == {'a'}
+    assert packages['c'].deps == {'b'}
+    assert packages['c'].test_deps == {'a'}
+    assert packages['d'].deps == set()